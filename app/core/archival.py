@@ -0,0 +1,139 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models, queries
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.database import SessionLocal
+
+# Колонки, общие для wishes и wishes_archive: перенос в обе стороны — это
+# INSERT ... SELECT на стороне БД, без загрузки строк в Python.
+WISH_COLUMNS = (
+    "id",
+    "title",
+    "link",
+    "price_estimate",
+    "notes",
+    "owner_id",
+    "is_favorite",
+    "created_at",
+    "updated_at",
+)
+
+wishes_archived_total = Counter(
+    "wishes_archived_total",
+    "Wishes moved from the hot table to wishes_archive",
+)
+wishes_restored_total = Counter(
+    "wishes_restored_total",
+    "Archived wishes moved back to the hot table before an update",
+)
+
+
+def archive_stale_wishes(
+    db: Session,
+    older_than: timedelta,
+    batch_size: int = 1000,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Переносит желания, не менявшиеся дольше older_than, в wishes_archive.
+    Пачки идут по возрастанию id и коммитятся по отдельности, так что
+    блокировки короткие, а прерванный запуск просто продолжится следующим.
+    """
+    Wish, WishArchive = models.Wish, models.WishArchive
+    now = now or models.utcnow()
+    cutoff = now - older_than
+    last_id = 0
+    moved = 0
+
+    while True:
+        # FOR UPDATE: строку, которую как раз обновляют, не заархивируем
+        # со старыми данными (в SQLite игнорируется — там запись и так одна).
+        ids = (
+            db.execute(
+                select(Wish.id)
+                .where(Wish.id > last_id, Wish.updated_at < cutoff)
+                .order_by(Wish.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            .scalars()
+            .all()
+        )
+        if not ids:
+            break
+
+        columns = [getattr(Wish, name) for name in WISH_COLUMNS]
+        db.execute(
+            insert(WishArchive).from_select(
+                [*WISH_COLUMNS, "archived_at"],
+                select(*columns, literal(now, WishArchive.archived_at.type)).where(
+                    Wish.id.in_(ids)
+                ),
+            )
+        )
+        db.execute(delete(Wish).where(Wish.id.in_(ids)))
+        db.commit()
+
+        wishes_archived_total.inc(len(ids))
+        moved += len(ids)
+        last_id = ids[-1]
+    return moved
+
+
+def restore_wish(db: Session, wish_id: int, owner_id: int) -> Optional[models.Wish]:
+    """
+    Возвращает желание из архива в горячую таблицу перед изменением. Если его
+    уже вернул параллельный запрос, отдаёт горячую копию; None — если желания
+    нет нигде. updated_at не трогаем: его сдвинет само изменение.
+    """
+    Wish, WishArchive = models.Wish, models.WishArchive
+    archived = [getattr(WishArchive, name) for name in WISH_COLUMNS]
+    match = (WishArchive.id == wish_id, WishArchive.owner_id == owner_id)
+
+    try:
+        restored = db.execute(
+            insert(Wish).from_select(
+                list(WISH_COLUMNS),
+                select(*archived).where(*match),
+            )
+        ).rowcount
+        deleted = db.execute(delete(WishArchive).where(*match)).rowcount
+    except IntegrityError:
+        # Параллельный запрос успел вставить то же id.
+        restored = deleted = 0
+    if restored == 1 and deleted == 1:
+        db.commit()
+        wishes_restored_total.inc()
+    else:
+        db.rollback()
+    return db.execute(queries.wish_by_id(wish_id, owner_id)).scalar_one_or_none()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Перенос давно не менявшихся желаний в wishes_archive",
+    )
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.wishes_archive_after_days
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.wishes_archive_batch_size
+    )
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        moved = archive_stale_wishes(
+            db, timedelta(days=args.older_than_days), batch_size=args.batch_size
+        )
+    print(f"archived {moved} wishes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import zlib
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli не обязателен
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard не обязателен
+    zstandard = None
+
+_ENCODINGS = ("gzip", "br", "zstd")
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def etag_for_encoding(etag: str, encoding: str) -> str:
+    # Сжатое тело — другое представление: сильный ETag обязан отличаться,
+    # иначе кеш может отдать gzip-байты клиенту без gzip (и наоборот).
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    """Обратное к etag_for_encoding: ETag несжатого представления."""
+    for encoding in _ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+class _GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # SYNC_FLUSH: клиент сможет распаковать уже отправленные строки стрима.
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _parse_accept_encoding(value: str) -> dict[str, float]:
+    accepted: dict[str, float] = {}
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip/br/zstd по Accept-Encoding (br и zstd — если
+    установлены brotli/zstandard). Ответы меньше minimum_size уходят как есть.
+    Потоковые ответы сжимаются по чанкам с flush, чтобы не терять TTFB.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+        # Порядок — предпочтение сервера при равном q у клиента.
+        self.codecs: dict[str, Callable[[], object]] = {}
+        if zstandard is not None:
+            self.codecs["zstd"] = lambda: _ZstdCompressor(zstd_level)
+        if brotli is not None:
+            self.codecs["br"] = lambda: _BrotliCompressor(brotli_quality)
+        self.codecs["gzip"] = lambda: _GzipCompressor(gzip_level)
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = _parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_quality = None, 0.0
+        for name in self.codecs:
+            quality = accepted.get(name, wildcard)
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(
+            send, encoding, self.codecs[encoding], self.minimum_size
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(
+        self,
+        send: Send,
+        encoding: str,
+        make_compressor: Callable[[], object],
+        minimum_size: int,
+    ) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.make_compressor = make_compressor
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _compressed_headers(self, content_length: Optional[int] = None) -> None:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = etag_for_encoding(headers["etag"], self.encoding)
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or not content_type.startswith(_COMPRESSIBLE_TYPES)
+            )
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await self._send(self.start_message)
+                    await self._send(message)
+                    return
+                compressor = self.make_compressor()
+                compressed = compressor.compress(body) + compressor.finish()
+                self._compressed_headers(content_length=len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            self.compressor = self.make_compressor()
+            self._compressed_headers()
+            await self._send(self.start_message)
+
+        chunk = self.compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self._send(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
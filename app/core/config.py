@@ -9,6 +9,60 @@ class Settings(BaseSettings):
     jwt_secret_key: str
     jwt_algorithm: str = "HS256"
     access_token_expires_minutes: int = 30
+    refresh_token_expires_days: int = 30
+
+    # Пользователи с доступом к /admin (профилировщик). JSON-список в env.
+    admin_usernames: list[str] = []
+
+    password_hash_scheme: str = "pbkdf2_sha256"
+    # None — раунды passlib по умолчанию; подобрать под хост:
+    # python -m app.core.password_calibration --target-ms 250
+    password_hash_rounds: int | None = None
+
+    db_query_cache_size: int = 500
+    db_prepare_threshold: int | None = 5
+
+    wishes_list_projection: bool = True
+
+    link_preview_enabled: bool = False
+    link_preview_ttl_seconds: int = 24 * 60 * 60
+    link_preview_error_ttl_seconds: int = 60 * 60
+    link_preview_max_concurrency: int = 4
+    link_preview_timeout_seconds: float = 5.0
+    link_preview_max_bytes: int = 512 * 1024
+
+    # memory — LRU в процессе; database — таблица idempotency_keys
+    idempotency_store: str = "memory"
+    idempotency_ttl_seconds: int = 24 * 60 * 60
+    idempotency_max_entries: int = 10_000
+
+    profiler_max_seconds: float = 60.0
+    # Общий для всех воркеров каталог: через него /admin/profile снимает
+    # стеки каждого воркера. Пусто — профилируется только принявший запрос.
+    profiler_dir: str = ""
+    profiler_poll_seconds: float = 0.5
+
+    # 0 — без партиционирования; иначе число hash-партиций wishes (Postgres)
+    wishes_partitions: int = 0
+    wishes_archive_after_days: int = 365
+    wishes_archive_batch_size: int = 1000
+
+    # Публичные снимки списков (/shared/{token}): сколько держать в памяти
+    # процесса до перечитывания из БД и сколько разрешать кешировать клиентам.
+    share_cache_ttl_seconds: int = 60
+    share_cache_max_entries: int = 1000
+    share_max_age_seconds: int = 60
+
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+
+    # none | memory | file | "package.module:factory"
+    tracing_exporter: str = "none"
+    tracing_file_path: str = "traces.jsonl"
+    tracing_sample_ratio: float = 0.01
 
     model_config = {
         "env_file": ".env",
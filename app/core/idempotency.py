@@ -0,0 +1,227 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional, Protocol, Tuple
+
+from fastapi import status
+from fastapi.responses import Response
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.errors import ApiError
+from app.database import SessionLocal
+
+MAX_KEY_LENGTH = 255
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: bytes
+    fingerprint: str
+    expires_at: float
+
+
+class IdempotencyStore(Protocol):
+    def get(self, key_hash: str) -> Optional[StoredResponse]: ...
+
+    def put(self, key_hash: str, response: StoredResponse) -> None: ...
+
+
+class MemoryIdempotencyStore:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, StoredResponse] = OrderedDict()
+
+    def get(self, key_hash: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._entries.get(key_hash)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.time():
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return stored
+
+    def put(self, key_hash: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._entries[key_hash] = response
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Ответы в таблице idempotency_keys: переживают рестарт и видны всем
+    воркерам. Блокировка по ключу при этом остаётся в пределах процесса.
+    Каждая запись заодно удаляет пачку истёкших: таблица не растёт дольше TTL.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        purge_batch_size: int = 100,
+    ) -> None:
+        self.session_factory = session_factory
+        self.purge_batch_size = purge_batch_size
+
+    def _purge_expired(self, db: Session) -> None:
+        Record = models.IdempotencyRecord
+        expired = (
+            select(Record.key_hash)
+            .where(Record.expires_at < datetime.now(timezone.utc))
+            .limit(self.purge_batch_size)
+            .scalar_subquery()
+        )
+        db.execute(delete(Record).where(Record.key_hash.in_(expired)))
+
+    def get(self, key_hash: str) -> Optional[StoredResponse]:
+        with self.session_factory() as db:
+            record = db.get(models.IdempotencyRecord, key_hash)
+            if record is None:
+                return None
+            expires_at = models.as_utc(record.expires_at).timestamp()
+            if expires_at <= time.time():
+                db.delete(record)
+                db.commit()
+                return None
+            return StoredResponse(
+                status_code=record.status_code,
+                body=record.body.encode(),
+                fingerprint=record.fingerprint,
+                expires_at=expires_at,
+            )
+
+    def put(self, key_hash: str, response: StoredResponse) -> None:
+        with self.session_factory() as db:
+            self._purge_expired(db)
+            db.merge(
+                models.IdempotencyRecord(
+                    key_hash=key_hash,
+                    fingerprint=response.fingerprint,
+                    status_code=response.status_code,
+                    body=response.body.decode(),
+                    expires_at=datetime.fromtimestamp(
+                        response.expires_at, timezone.utc
+                    ),
+                )
+            )
+            try:
+                db.commit()
+            except IntegrityError:
+                # Тот же ключ параллельно сохранил другой воркер.
+                db.rollback()
+
+
+def _digest(*parts: str) -> str:
+    # HMAC, а не голый sha256: отпечаток тела регистрации зависит от пароля.
+    message = "\0".join(parts).encode()
+    return hmac.new(
+        settings.jwt_secret_key.encode(), message, hashlib.sha256
+    ).hexdigest()
+
+
+class Idempotency:
+    """
+    Поддержка заголовка Idempotency-Key: первый запрос с ключом выполняет
+    обработчик и сохраняет код ответа и тело, повторы получают сохранённый
+    ответ без повторного выполнения. Одновременные дубли ждут первый запрос
+    на блокировке ключа. Сохраняются только успешные ответы: ошибка не
+    «залипает», и повтор с тем же ключом выполнится заново.
+    """
+
+    def __init__(self, store: IdempotencyStore, ttl_seconds: int) -> None:
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._guard = threading.Lock()
+        self._locks: dict[str, list] = {}
+
+    @contextmanager
+    def _key_lock(self, key_hash: str) -> Iterator[None]:
+        with self._guard:
+            entry = self._locks.setdefault(key_hash, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key_hash]
+
+    def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        payload: str,
+        handler: Callable[[], Tuple[int, bytes]],
+    ) -> Response:
+        if key is None:
+            status_code, body = handler()
+            return Response(body, status_code, media_type="application/json")
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ApiError(
+                code="invalid_idempotency_key",
+                message=f"Idempotency-Key must be 1..{MAX_KEY_LENGTH} chars",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        key_hash = _digest(scope, key)
+        fingerprint = _digest(payload)
+
+        with self._key_lock(key_hash):
+            stored = self.store.get(key_hash)
+            if stored is not None:
+                if not hmac.compare_digest(stored.fingerprint, fingerprint):
+                    raise ApiError(
+                        code="idempotency_key_reused",
+                        message="Idempotency-Key was already used with another request",
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return Response(
+                    stored.body,
+                    stored.status_code,
+                    headers={"Idempotent-Replayed": "true"},
+                    media_type="application/json",
+                )
+
+            status_code, body = handler()
+            self.store.put(
+                key_hash,
+                StoredResponse(
+                    status_code=status_code,
+                    body=body,
+                    fingerprint=fingerprint,
+                    expires_at=time.time() + self.ttl_seconds,
+                ),
+            )
+        return Response(body, status_code, media_type="application/json")
+
+
+def _create_store() -> IdempotencyStore:
+    if settings.idempotency_store == "database":
+        return DatabaseIdempotencyStore()
+    return MemoryIdempotencyStore(settings.idempotency_max_entries)
+
+
+# Создаётся при импорте, а не при первом запросе: иначе два первых запроса из
+# разных потоков могли бы собрать по своему экземпляру — каждый со своими
+# блокировками по ключу — и дубликат выполнился бы дважды.
+idempotency = Idempotency(_create_store(), settings.idempotency_ttl_seconds)
+
+
+def get_idempotency() -> Idempotency:
+    return idempotency
@@ -0,0 +1,333 @@
+import asyncio
+import http.client
+import ipaddress
+import socket
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from html.parser import HTMLParser
+from typing import Callable, Optional, Protocol
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.core.config import settings
+from app.database import SessionLocal
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "ref", "_openstat"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Приводит ссылку к каноническому виду, чтобы одинаковые товары с разными
+    utm-метками, регистром хоста и якорями давали один ключ кеша.
+    Для всего, что не http(s), возвращает None.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if scheme not in _DEFAULT_PORTS or not host:
+        return None
+
+    netloc = host
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        netloc = f"{host}:{port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    normalized = urlunsplit((scheme, netloc, path, urlencode(query), ""))
+    if len(normalized) > 500:
+        return None
+    return normalized
+
+
+@dataclass
+class LinkPreview:
+    title: Optional[str] = None
+    image_url: Optional[str] = None
+    price: Optional[Decimal] = None
+    currency: Optional[str] = None
+
+
+class LinkFetchError(Exception):
+    pass
+
+
+class LinkFetcher(Protocol):
+    async def fetch(self, url: str) -> LinkPreview: ...
+
+
+class _PreviewParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.meta: dict[str, str] = {}
+        self.title_parts: list[str] = []
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            attrs_dict = {key: value for key, value in attrs if value is not None}
+            key = attrs_dict.get("property") or attrs_dict.get("name")
+            content = attrs_dict.get("content")
+            if key and content is not None:
+                self.meta.setdefault(key.lower(), content.strip())
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title_parts.append(data)
+
+
+def parse_preview(html: str, base_url: str) -> LinkPreview:
+    parser = _PreviewParser()
+    parser.feed(html)
+    meta = parser.meta
+
+    title = meta.get("og:title") or "".join(parser.title_parts).strip() or None
+    image_url = meta.get("og:image")
+    if image_url:
+        image_url = urljoin(base_url, image_url)
+
+    price = None
+    raw_price = meta.get("product:price:amount") or meta.get("og:price:amount")
+    if raw_price:
+        try:
+            price = Decimal(raw_price.replace(",", ".")).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            price = None
+    currency = meta.get("product:price:currency") or meta.get("og:price:currency")
+
+    return LinkPreview(
+        title=title[:300] if title else None,
+        image_url=image_url if image_url and len(image_url) <= 1000 else None,
+        price=price if price is not None and 0 <= price < Decimal("1e8") else None,
+        currency=currency[:8] if currency else None,
+    )
+
+
+def _ensure_http_url(url: str) -> None:
+    parts = urlsplit(url)
+    if parts.scheme not in _DEFAULT_PORTS or not parts.hostname:
+        raise LinkFetchError("unsupported url")
+
+
+def _public_address(host: str, port: int) -> str:
+    # Ссылки присылают пользователи: не даём использовать сервер как прокси во
+    # внутреннюю сеть (SSRF). Проверяем каждый адрес, в который резолвится хост.
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as exc:
+        raise LinkFetchError("host not resolvable") from exc
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if not address.is_global:
+            raise LinkFetchError("host is not public")
+    return infos[0][4][0]
+
+
+def _connect_public(host: str, port: int, timeout, source_address) -> socket.socket:
+    # Соединяемся с тем самым адресом, который проверили: второй резолв при
+    # connect() позволил бы DNS rebinding подменить его на внутренний.
+    address = _public_address(host, port)
+    return socket.create_connection((address, port), timeout, source_address)
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def connect(self) -> None:
+        self.sock = _connect_public(
+            self.host, self.port, self.timeout, self.source_address
+        )
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self) -> None:
+        sock = _connect_public(self.host, self.port, self.timeout, self.source_address)
+        # SNI и проверка сертификата — по имени хоста, не по адресу.
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _SafeRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        # Адрес цели редиректа проверит соединение, здесь — только схема.
+        _ensure_http_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class HttpLinkFetcher:
+    def __init__(self, timeout: float, max_bytes: int) -> None:
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        # Без прокси из окружения: иначе соединение шло бы к прокси, а не к
+        # проверенному адресу.
+        self._opener = urllib.request.build_opener(
+            urllib.request.ProxyHandler({}),
+            _PublicHTTPHandler(),
+            _PublicHTTPSHandler(),
+            _SafeRedirectHandler(),
+        )
+
+    def _fetch_sync(self, url: str) -> LinkPreview:
+        _ensure_http_url(url)
+        request = urllib.request.Request(
+            url,
+            headers={"User-Agent": "WishlistLinkPreview/1.0", "Accept": "text/html"},
+        )
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                content_type = response.headers.get_content_type()
+                if content_type not in ("text/html", "application/xhtml+xml"):
+                    raise LinkFetchError("not an html page")
+                charset = response.headers.get_content_charset() or "utf-8"
+                body = response.read(self.max_bytes)
+                final_url = response.geturl()
+        except LinkFetchError:
+            raise
+        except (OSError, ValueError) as exc:
+            raise LinkFetchError("fetch failed") from exc
+        try:
+            text = body.decode(charset, errors="replace")
+        except LookupError:
+            # Неизвестная кодировка в Content-Type — читаем как utf-8.
+            text = body.decode("utf-8", errors="replace")
+        return parse_preview(text, final_url)
+
+    async def fetch(self, url: str) -> LinkPreview:
+        return await run_in_threadpool(self._fetch_sync, url)
+
+
+def lookup_preview(db: Session, url: str) -> Optional[models.LinkMetadata]:
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None
+    return db.execute(
+        select(models.LinkMetadata).where(models.LinkMetadata.url == normalized)
+    ).scalar_one_or_none()
+
+
+def is_fresh(record: models.LinkMetadata) -> bool:
+    return models.as_utc(record.expires_at) > datetime.now(timezone.utc)
+
+
+class LinkPreviewService:
+    """
+    Обогащение ссылок из желаний: одна загрузка на нормализованный URL.
+
+    Дубликаты отсекаются дважды: по свежей записи в link_metadata (TTL) и по
+    уже идущей загрузке того же URL в этом процессе. Число одновременных
+    загрузок ограничено семафором.
+    """
+
+    def __init__(
+        self,
+        fetcher: LinkFetcher,
+        session_factory: Callable[[], Session] = SessionLocal,
+        ttl: timedelta = timedelta(seconds=settings.link_preview_ttl_seconds),
+        error_ttl: timedelta = timedelta(
+            seconds=settings.link_preview_error_ttl_seconds
+        ),
+        max_concurrency: int = settings.link_preview_max_concurrency,
+    ) -> None:
+        self.fetcher = fetcher
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def enrich(self, url: str) -> None:
+        normalized = normalize_url(url)
+        if normalized is None:
+            return
+
+        task = self._inflight.get(normalized)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(normalized))
+            self._inflight[normalized] = task
+            task.add_done_callback(lambda _: self._inflight.pop(normalized, None))
+        await task
+
+    async def _refresh(self, url: str) -> None:
+        if await run_in_threadpool(self._has_fresh, url):
+            return
+
+        async with self._semaphore:
+            try:
+                preview = await self.fetcher.fetch(url)
+                error = None
+            except LinkFetchError as exc:
+                preview, error = LinkPreview(), str(exc)[:200]
+
+        await run_in_threadpool(self._store, url, preview, error)
+
+    def _has_fresh(self, url: str) -> bool:
+        with self.session_factory() as db:
+            record = lookup_preview(db, url)
+            return record is not None and is_fresh(record)
+
+    def _store(self, url: str, preview: LinkPreview, error: Optional[str]) -> None:
+        now = datetime.now(timezone.utc)
+        expires_at = now + (self.error_ttl if error else self.ttl)
+
+        with self.session_factory() as db:
+            record = lookup_preview(db, url)
+            if record is None:
+                record = models.LinkMetadata(url=url)
+                db.add(record)
+            record.title = preview.title
+            record.image_url = preview.image_url
+            record.price = preview.price
+            record.currency = preview.currency
+            record.error = error
+            record.fetched_at = now
+            record.expires_at = expires_at
+            try:
+                db.commit()
+            except IntegrityError:
+                # Ту же ссылку параллельно сохранил другой воркер — его запись не хуже.
+                db.rollback()
+
+
+# Один сервис на процесс, созданный при импорте: ленивое создание из
+# нескольких потоков дало бы два семафора и удвоило предел загрузок.
+link_previews = LinkPreviewService(
+    HttpLinkFetcher(
+        timeout=settings.link_preview_timeout_seconds,
+        max_bytes=settings.link_preview_max_bytes,
+    )
+)
+
+
+def get_link_previews() -> Optional[LinkPreviewService]:
+    if not settings.link_preview_enabled:
+        return None
+    return link_previews
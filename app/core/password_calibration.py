@@ -0,0 +1,72 @@
+import argparse
+import time
+from typing import Optional
+
+from passlib.registry import get_crypt_handler
+
+# Модуль намеренно не импортирует settings: калибровку запускают на хосте
+# до того, как там появился .env.
+
+
+def _measure_hash(handler, rounds: int, samples: int) -> float:
+    configured = handler.using(rounds=rounds)
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        configured.hash("calibration-password")
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def calibrate_rounds(
+    scheme: str,
+    target_seconds: float,
+    samples: int = 3,
+    probe_rounds: Optional[int] = None,
+) -> int:
+    """
+    Подбирает число раундов, при котором хеширование (и проверка — это та же
+    работа) занимает на этом хосте примерно target_seconds.
+    """
+    handler = get_crypt_handler(scheme)
+    if getattr(handler, "rounds_cost", None) is None:
+        raise ValueError(f"{scheme} does not support tunable rounds")
+
+    rounds = probe_rounds or handler.default_rounds
+    elapsed = _measure_hash(handler, rounds, samples)
+
+    if handler.rounds_cost == "log2":
+        while elapsed < target_seconds / 2 and rounds < handler.max_rounds:
+            rounds += 1
+            elapsed *= 2
+        while elapsed > target_seconds * 1.5 and rounds > handler.min_rounds:
+            rounds -= 1
+            elapsed /= 2
+        return rounds
+
+    scaled = int(rounds * target_seconds / elapsed)
+    # Округляем до «красивого» числа, чтобы не перехешировать из-за шума замера.
+    step = 10 ** max(len(str(scaled)) - 2, 0)
+    scaled = max(step, round(scaled / step) * step)
+    return max(handler.min_rounds, min(handler.max_rounds, scaled))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Подбор PASSWORD_HASH_ROUNDS под целевое время проверки пароля",
+    )
+    parser.add_argument("--scheme", default="pbkdf2_sha256")
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rounds = calibrate_rounds(args.scheme, args.target_ms / 1000, samples=args.samples)
+    handler = get_crypt_handler(args.scheme)
+    actual = _measure_hash(handler, rounds, args.samples)
+    print(f"# {args.scheme}: {rounds} rounds ~ {actual * 1000:.0f} ms per verify")
+    print(f"PASSWORD_HASH_SCHEME={args.scheme}")
+    print(f"PASSWORD_HASH_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import json
+import os
+import secrets
+import shutil
+import sys
+import threading
+import time
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import Histogram
+
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    labelnames=("method", "route", "status"),
+)
+http_request_phase_seconds = Histogram(
+    "http_request_phase_seconds",
+    "Time spent in each phase of an HTTP request",
+    labelnames=("method", "route", "phase"),
+)
+
+# Фазы исключающие: время вложенной фазы (например, запрос к БД внутри auth)
+# вычитается из внешней. Всё, что не попало ни в одну фазу — маршрутизация,
+# валидация запроса и response_model, middleware, — остаётся в "framework".
+FRAMEWORK_PHASE = "framework"
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self._stack: list[list] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            if self._stack:
+                self._stack[-1][1] += seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # [начало, время вложенных фаз]
+        frame = [time.perf_counter(), 0.0]
+        with self._lock:
+            self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame[0]
+            with self._lock:
+                self._stack.remove(frame)
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+                if self._stack:
+                    self._stack[-1][1] += elapsed
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.phase(name):
+        yield
+
+
+def instrument_engine(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# Время старта живёт на ExecutionContext, а не в conn.info: у упавшего
+# запроса after_cursor_execute не вызывается, и запись в conn.info пережила
+# бы возврат соединения в пул.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profiling_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_profiling_started", None)
+    timings = _current.get()
+    if started is not None and timings is not None:
+        timings.add("db", time.perf_counter() - started)
+
+
+class LatencyMiddleware:
+    """
+    Всегда включённые гистограммы задержек по маршруту и по фазам запроса.
+    Маршрут берётся из шаблона пути (/wishes/{wish_id}), а не из URL, чтобы
+    число серий не росло с числом id.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration_seconds.observe(
+                total, method=method, route=route_path, status=status_code
+            )
+            for name, seconds in timings.phases.items():
+                http_request_phase_seconds.observe(
+                    seconds, method=method, route=route_path, phase=name
+                )
+            http_request_phase_seconds.observe(
+                max(total - sum(timings.phases.values()), 0.0),
+                method=method,
+                route=route_path,
+                phase=FRAMEWORK_PHASE,
+            )
+
+
+def _frame_name(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профайлер: раз в interval снимает стеки всех потоков
+    процесса через sys._current_frames() и считает одинаковые стеки.
+    Результат — collapsed stacks ("a;b;c 42"), которые понимают
+    flamegraph.pl, speedscope и inferno. Накладные расходы есть только
+    во время профилирования. Видит только свой процесс; остальные воркеры
+    снимает ProfileExchange.
+    """
+
+    def __init__(self) -> None:
+        self._busy = threading.Lock()
+
+    def profile(self, seconds: float, interval: float) -> Optional[str]:
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return self._sample(seconds, interval)
+        finally:
+            self._busy.release()
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        stacks: FrameCounter[str] = FrameCounter()
+        own_thread = threading.get_ident()
+        # Корень стека — pid процесса: дампы разных воркеров можно склеить
+        # (cat) в один flamegraph, не смешивая их потоки.
+        root = f"pid-{os.getpid()}"
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                thread = thread_names.get(thread_id, f"thread-{thread_id}")
+                names.append(thread.replace(";", "_").replace(" ", "_"))
+                names.append(root)
+                stacks[";".join(reversed(names))] += 1
+            time.sleep(interval)
+
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler()
+
+
+class ProfileExchange:
+    """
+    Профилирование всех воркеров через общий каталог. collect() публикует
+    в нём request.json; каждый воркер опрашивает файл из фонового потока,
+    снимает свои стеки и пишет <сессия>/<pid>.collapsed. Дампы коренятся
+    в pid-<pid>, так что их склейка — один flamegraph по всем воркерам.
+    """
+
+    REQUEST = "request.json"
+    # Запас на запись дампов после окончания сэмплирования.
+    WRITE_GRACE_SECONDS = 1.0
+    # Запрос, срок которого вышел так давно, оставил упавший воркер.
+    STALE_AFTER_SECONDS = 10.0
+
+    def __init__(self, profiler: SamplingProfiler) -> None:
+        self.profiler = profiler
+        self.directory: Optional[str] = None
+        self.poll_interval = 0.5
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_session: Optional[str] = None
+
+    def configure(self, directory: Optional[str], poll_interval: float) -> None:
+        self.directory = directory
+        self.poll_interval = poll_interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="profile-exchange", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def collect(self, seconds: float, interval: float) -> Optional[dict[int, str]]:
+        """
+        Профилирует все воркеры, следящие за каталогом; None — если идёт
+        другая сессия. Воркер, не успевший к сроку, в результат не попадёт.
+        """
+        session = secrets.token_hex(8)
+        # Воркер замечает запрос не сразу: окно сэмплирования у всех общее
+        # и включает один интервал опроса.
+        until = time.time() + self.poll_interval + seconds
+        request = {"session": session, "until": until, "interval": interval}
+        os.makedirs(os.path.join(self.directory, session))
+        if not self._publish(request):
+            shutil.rmtree(os.path.join(self.directory, session))
+            return None
+        try:
+            time.sleep(max(until - time.time(), 0.0) + self.WRITE_GRACE_SECONDS)
+            return self._read_dumps(session)
+        finally:
+            os.unlink(os.path.join(self.directory, self.REQUEST))
+            shutil.rmtree(os.path.join(self.directory, session), ignore_errors=True)
+
+    def _publish(self, request: dict) -> bool:
+        path = os.path.join(self.directory, self.REQUEST)
+        tmp = f"{path}.{request['session']}"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(request, fh)
+        try:
+            # link() атомарен и не перезаписывает: одна сессия за раз.
+            for _ in range(2):
+                try:
+                    os.link(tmp, path)
+                    return True
+                except FileExistsError:
+                    current = self._read_request()
+                    stale_at = time.time() - self.STALE_AFTER_SECONDS
+                    if current is not None and current["until"] > stale_at:
+                        return False
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+            return False
+        finally:
+            os.unlink(tmp)
+
+    def _read_request(self) -> Optional[dict]:
+        try:
+            with open(
+                os.path.join(self.directory, self.REQUEST), encoding="utf-8"
+            ) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _read_dumps(self, session: str) -> dict[int, str]:
+        dumps = {}
+        session_dir = os.path.join(self.directory, session)
+        for name in os.listdir(session_dir):
+            pid, _, ext = name.partition(".")
+            if ext == "collapsed" and pid.isdigit():
+                with open(os.path.join(session_dir, name), encoding="utf-8") as fh:
+                    dumps[int(pid)] = fh.read()
+        return dict(sorted(dumps.items()))
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            request = self._read_request()
+            if request is None or request["session"] == self._last_session:
+                continue
+            self._last_session = request["session"]
+            seconds = request["until"] - time.time()
+            if seconds <= 0:
+                continue
+            collapsed = self.profiler.profile(seconds, request["interval"])
+            if collapsed is not None:
+                self._write_dump(request["session"], collapsed)
+
+    def _write_dump(self, session: str, collapsed: str) -> None:
+        path = os.path.join(self.directory, session, f"{os.getpid()}.collapsed")
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as fh:
+                fh.write(collapsed)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            # Сессия уже закрыта (каталог удалён) — дамп опоздал.
+            pass
+
+
+exchange = ProfileExchange(profiler)
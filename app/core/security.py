@@ -1,27 +1,82 @@
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
-from app import models
+from app import models, queries
 from app.core.config import settings
 from app.core.errors import ApiError
+from app.core.metrics import Counter, Histogram
+from app.core.profiling import phase
+from app.core.tracing import tracer
 from app.database import get_db
 
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto",
+# Схема, которой хешировались пароли до появления настройки: её хеши должны
+# по-прежнему проверяться и перехешироваться при входе.
+LEGACY_PASSWORD_SCHEMES = ["pbkdf2_sha256"]
+
+password_verify_seconds = Histogram(
+    "password_verify_seconds",
+    "Time spent verifying password hashes",
+    labelnames=("scheme",),
+)
+password_rehash_total = Counter(
+    "password_rehash_total",
+    "Password hashes upgraded on login to the current hash policy",
+    labelnames=("scheme",),
+)
+
+
+def build_pwd_context(scheme: str, rounds: Optional[int] = None) -> CryptContext:
+    schemes = [scheme] + [s for s in LEGACY_PASSWORD_SCHEMES if s != scheme]
+    policy = {}
+    if rounds is not None:
+        # min == max == default: needs_update срабатывает на любое изменение
+        # раундов, в том числе на снижение стоимости.
+        policy = {
+            f"{scheme}__default_rounds": rounds,
+            f"{scheme}__min_rounds": rounds,
+            f"{scheme}__max_rounds": rounds,
+        }
+    return CryptContext(schemes=schemes, deprecated="auto", **policy)
+
+
+pwd_context = build_pwd_context(
+    settings.password_hash_scheme,
+    settings.password_hash_rounds,
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def verify_and_update(
+    plain_password: str,
+    hashed_password: str,
+) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль и, если хеш не соответствует текущей политике
+    (схема или число раундов), возвращает новый хеш для сохранения.
+    """
+    scheme = pwd_context.identify(hashed_password)
+    with (
+        phase("auth"),
+        tracer.span("auth.verify_password", {"auth.hash_scheme": scheme}),
+        password_verify_seconds.time(scheme=scheme),
+    ):
+        verified, new_hash = pwd_context.verify_and_update(
+            plain_password, hashed_password
+        )
+    if new_hash is not None:
+        password_rehash_total.inc(scheme=scheme)
+    return verified, new_hash
 
 
 def get_password_hash(password: str) -> str:
@@ -44,10 +99,117 @@ def create_access_token(
     )
 
 
+def _hash_refresh_secret(secret: str) -> str:
+    # Секрет refresh-токена случайный и длинный: медленный хеш не нужен,
+    # достаточно HMAC — утечка таблицы не даёт валидных токенов.
+    return hmac.new(
+        settings.jwt_secret_key.encode(),
+        secret.encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def create_refresh_token(
+    db: Session,
+    user_id: int,
+    token_id: Optional[str] = None,
+) -> str:
+    """
+    Создаёт refresh-токен вида "<token_id>.<secret>". В БД хранится только
+    HMAC секрета; token_id — индексируемый ключ для поиска записи.
+    """
+    token_id = token_id or secrets.token_hex(16)
+    secret = secrets.token_urlsafe(32)
+    db.add(
+        models.RefreshToken(
+            token_id=token_id,
+            token_hash=_hash_refresh_secret(secret),
+            user_id=user_id,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.refresh_token_expires_days),
+        )
+    )
+    return f"{token_id}.{secret}"
+
+
+def _invalid_refresh_token() -> ApiError:
+    return ApiError(
+        code="invalid_refresh_token",
+        message="Refresh token is invalid or expired",
+        status_code=status.HTTP_401_UNAUTHORIZED,
+    )
+
+
+def _find_refresh_token(db: Session, raw_token: str) -> models.RefreshToken:
+    token_id, _, secret = raw_token.partition(".")
+    if not token_id or not secret:
+        raise _invalid_refresh_token()
+
+    record = db.execute(queries.refresh_token_by_id(token_id)).scalar_one_or_none()
+    if record is None or not hmac.compare_digest(
+        record.token_hash, _hash_refresh_secret(secret)
+    ):
+        raise _invalid_refresh_token()
+    return record
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    db.execute(
+        update(models.RefreshToken)
+        .where(
+            models.RefreshToken.user_id == user_id,
+            models.RefreshToken.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Tuple[int, str]:
+    """
+    Меняет refresh-токен на новый: старый отзывается, возвращаются
+    (user_id, новый токен). Повторное предъявление уже отозванного токена
+    означает, что его украли, — отзываем все токены пользователя.
+    """
+    record = _find_refresh_token(db, raw_token)
+    now = datetime.now(timezone.utc)
+    if models.as_utc(record.expires_at) <= now:
+        raise _invalid_refresh_token()
+
+    # Условный UPDATE вместо проверки в Python: из двух параллельных обменов
+    # одного токена выиграет ровно один, второй считается повторным.
+    token_id = secrets.token_hex(16)
+    revoked = db.execute(
+        update(models.RefreshToken)
+        .where(
+            models.RefreshToken.id == record.id,
+            models.RefreshToken.revoked_at.is_(None),
+        )
+        .values(revoked_at=now, replaced_by=token_id)
+        .execution_options(synchronize_session=False)
+    )
+    if revoked.rowcount != 1:
+        revoke_user_refresh_tokens(db, record.user_id)
+        db.commit()
+        raise _invalid_refresh_token()
+
+    return record.user_id, create_refresh_token(db, record.user_id, token_id)
+
+
+def revoke_refresh_token(db: Session, raw_token: str) -> None:
+    record = _find_refresh_token(db, raw_token)
+    if record.revoked_at is None:
+        record.revoked_at = datetime.now(timezone.utc)
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
 ) -> models.User:
+    with phase("auth"), tracer.span("auth.get_current_user"):
+        return _authenticate(token, db)
+
+
+def _authenticate(token: str, db: Session) -> models.User:
     credentials_error = ApiError(
         code="unauthorized",
         message="Could not validate credentials",
@@ -55,11 +217,12 @@ def get_current_user(
     )
 
     try:
-        payload = jwt.decode(
-            token,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm],
-        )
+        with tracer.span("auth.jwt_decode"):
+            payload = jwt.decode(
+                token,
+                settings.jwt_secret_key,
+                algorithms=[settings.jwt_algorithm],
+            )
         sub = payload.get("sub")
         if sub is None:
             raise credentials_error
@@ -67,7 +230,20 @@ def get_current_user(
     except (JWTError, ValueError):
         raise credentials_error
 
-    user = db.get(models.User, user_id)
+    with tracer.span("auth.load_user", {"enduser.id": user_id}):
+        user = db.execute(queries.user_by_id(user_id)).scalar_one_or_none()
     if not user:
         raise credentials_error
     return user
+
+
+def get_current_admin(
+    current_user: models.User = Depends(get_current_user),
+) -> models.User:
+    if current_user.username not in settings.admin_usernames:
+        raise ApiError(
+            code="forbidden",
+            message="Admin access required",
+            status_code=status.HTTP_403_FORBIDDEN,
+        )
+    return current_user
@@ -0,0 +1,236 @@
+import bisect
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models, queries, schemas
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.database import SessionLocal
+
+shared_snapshot_builds_total = Counter(
+    "shared_snapshot_builds_total",
+    "Shared wishlist snapshots built from the database (full) or patched (patch)",
+    labelnames=("kind",),
+)
+
+
+def _hash_share_secret(secret: str) -> str:
+    # Как у refresh-токенов: секрет случайный, хватает HMAC.
+    return hmac.new(
+        settings.jwt_secret_key.encode(),
+        secret.encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def create_share(db: Session, owner_id: int) -> Tuple[models.WishlistShare, str]:
+    """
+    Создаёт ссылку вида "<token_id>.<secret>". В БД хранится только HMAC
+    секрета; token_id — публичный идентификатор ссылки (для отзыва).
+    """
+    secret = secrets.token_urlsafe(24)
+    share = models.WishlistShare(
+        token_id=secrets.token_hex(16),
+        token_hash=_hash_share_secret(secret),
+        owner_id=owner_id,
+    )
+    db.add(share)
+    db.commit()
+    return share, f"{share.token_id}.{secret}"
+
+
+@dataclass
+class Snapshot:
+    body: bytes
+    etag: str
+
+
+class _SharedList:
+    """
+    Список владельца в порядке list_wishes (новые первыми), где каждое
+    желание уже сериализовано. Изменение одного желания пересериализует
+    только его; тело снимка склеивается из готовых кусков при следующем
+    просмотре.
+    """
+
+    def __init__(self, loaded_at: float) -> None:
+        self.loaded_at = loaded_at
+        self._keys: list[tuple] = []
+        self._items: dict[int, tuple[tuple, bytes]] = {}
+        self._snapshot: Optional[Snapshot] = None
+
+    def put(self, wish: Any) -> None:
+        self.remove(wish.id)
+        key = (-models.as_utc(wish.created_at).timestamp(), -wish.id)
+        bisect.insort(self._keys, key)
+        body = schemas.SharedWishRead.model_validate(wish).model_dump_json().encode()
+        self._items[wish.id] = (key, body)
+        self._snapshot = None
+
+    def remove(self, wish_id: int) -> None:
+        entry = self._items.pop(wish_id, None)
+        if entry is not None:
+            del self._keys[bisect.bisect_left(self._keys, entry[0])]
+            self._snapshot = None
+
+    def snapshot(self) -> Snapshot:
+        if self._snapshot is None:
+            items = b",".join(self._items[-key[1]][1] for key in self._keys)
+            body = b'{"items":[%s],"total":%d}' % (items, len(self._keys))
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self._snapshot = Snapshot(body=body, etag=etag)
+        return self._snapshot
+
+
+class SharedLists:
+    """
+    Кеш публичных снимков в памяти процесса: просмотр по уже известной
+    ссылке не обращается к БД. Записи владельца патчат его снимок через
+    wishes_changed(); изменения из других процессов (воркеры, архивация)
+    и отзыв ссылки в другом воркере видны не позже чем через ttl.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        ttl_seconds: float = 60,
+        max_entries: int = 1000,
+    ) -> None:
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # token_id -> (owner_id, token_hash, loaded_at); owner_id None — ссылки нет.
+        self._shares: OrderedDict[str, tuple] = OrderedDict()
+        self._lists: OrderedDict[int, _SharedList] = OrderedDict()
+        # owner_id -> [загрузок в полёте, записей за время загрузок]
+        self._loads: dict[int, list[int]] = {}
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl_seconds
+
+    def _remember(self, cache: OrderedDict, key: Any, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _resolve(self, token: str) -> Optional[int]:
+        token_id, _, secret = token.partition(".")
+        if not token_id or not secret:
+            return None
+
+        with self._lock:
+            entry = self._shares.get(token_id)
+        if entry is None or not self._fresh(entry[2]):
+            with self.session_factory() as db:
+                share = db.execute(
+                    queries.share_by_token_id(token_id)
+                ).scalar_one_or_none()
+            if share is None or share.revoked_at is not None:
+                entry = (None, "", time.monotonic())
+            else:
+                entry = (share.owner_id, share.token_hash, time.monotonic())
+            with self._lock:
+                self._remember(self._shares, token_id, entry)
+
+        owner_id, token_hash, _ = entry
+        if owner_id is None or not hmac.compare_digest(
+            token_hash, _hash_share_secret(secret)
+        ):
+            return None
+        return owner_id
+
+    def _load(self, owner_id: int) -> _SharedList:
+        shared = _SharedList(time.monotonic())
+        with self.session_factory() as db:
+            for row in db.execute(queries.owner_wishes_rows(owner_id)):
+                shared.put(row)
+        shared_snapshot_builds_total.inc(kind="full")
+        return shared
+
+    def get(self, token: str) -> Optional[Snapshot]:
+        owner_id = self._resolve(token)
+        if owner_id is None:
+            return None
+
+        with self._lock:
+            shared = self._lists.get(owner_id)
+            if shared is not None and self._fresh(shared.loaded_at):
+                self._lists.move_to_end(owner_id)
+                return shared.snapshot()
+            loads = self._loads.setdefault(owner_id, [0, 0])
+            loads[0] += 1
+            writes_before = loads[1]
+
+        try:
+            shared = self._load(owner_id)
+        finally:
+            with self._lock:
+                loads[0] -= 1
+                if loads[0] == 0:
+                    del self._loads[owner_id]
+
+        with self._lock:
+            # Запись во время загрузки могла не попасть в прочитанные строки:
+            # такой снимок отдаём один раз, но не кешируем.
+            if loads[1] == writes_before:
+                self._remember(self._lists, owner_id, shared)
+            return shared.snapshot()
+
+    def wishes_changed(
+        self,
+        owner_id: int,
+        saved: Optional[Any] = None,
+        removed: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            loads = self._loads.get(owner_id)
+            if loads is not None:
+                loads[1] += 1
+            shared = self._lists.get(owner_id)
+            if shared is None:
+                return
+            if saved is None and removed is None:
+                del self._lists[owner_id]
+                return
+            if saved is not None:
+                shared.put(saved)
+            if removed is not None:
+                shared.remove(removed)
+            shared_snapshot_builds_total.inc(kind="patch")
+
+    def revoke(self, db: Session, owner_id: int, token_id: str) -> bool:
+        share = db.execute(queries.share_by_token_id(token_id)).scalar_one_or_none()
+        if share is None or share.owner_id != owner_id:
+            return False
+        if share.revoked_at is None:
+            share.revoked_at = datetime.now(timezone.utc)
+            db.commit()
+        with self._lock:
+            self._shares.pop(token_id, None)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shares.clear()
+            self._lists.clear()
+
+
+shared_lists = SharedLists(
+    ttl_seconds=settings.share_cache_ttl_seconds,
+    max_entries=settings.share_cache_max_entries,
+)
+
+
+def get_shared_lists() -> SharedLists:
+    return shared_lists
@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Callable, Hashable, Tuple
+
+from app.core.metrics import Counter
+
+singleflight_shared_total = Counter(
+    "singleflight_shared_total",
+    "Reads served from a concurrent identical in-flight call",
+    labelnames=("route",),
+)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Склеивает одновременные одинаковые вызовы: пока лидер выполняет fn для
+    ключа, остальные потоки с тем же ключом ждут и получают его результат
+    (или его исключение). Ничего не кеширует дольше самого вызова.
+
+    Ключ — кортеж, первым элементом которого идёт владелец данных: forget()
+    по владельцу отцепляет его текущие вызовы, и запросы после записи
+    стартуют новый вызов вместо того, чтобы получить данные до записи.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Tuple[Hashable, ...], _Call] = {}
+
+    def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def forget(self, owner: Hashable) -> None:
+        with self._lock:
+            for key in [key for key in self._calls if key[0] == owner]:
+                del self._calls[key]
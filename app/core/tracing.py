@@ -0,0 +1,331 @@
+import importlib
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Спаны в модели OpenTelemetry (128-битный trace id, 64-битный span id,
+# W3C traceparent), но без зависимости от opentelemetry-sdk: экспортёр
+# получает готовые dict в духе OTLP/JSON и может переложить их куда угодно.
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_MAX_STATEMENT_LENGTH = 1000
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+        "_tracer",
+    )
+
+    sampled = True
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: int,
+        parent_id: Optional[int],
+        attributes: Optional[dict] = None,
+    ) -> None:
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.status = "UNSET"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:200]
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "parentSpanId": f"{self.parent_id:016x}" if self.parent_id else "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class NonRecordingSpan:
+    """
+    Спан не попавшего в выборку запроса: только несёт trace/span id для
+    traceparent. Дочерние спаны не создаются — возвращается он же, так что
+    на горячем пути нет ни аллокаций, ни замеров времени.
+    """
+
+    __slots__ = ("trace_id", "span_id")
+
+    sampled = False
+
+    def __init__(self, trace_id: int, span_id: int) -> None:
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_status(self, status: str) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_current_span: ContextVar[Optional[Span | NonRecordingSpan]] = ContextVar(
+    "current_span", default=None
+)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[int, int, bool]]:
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    trace_id, span_id = int(match.group(1), 16), int(match.group(2), 16)
+    if not trace_id or not span_id:
+        return None
+    return trace_id, span_id, bool(int(match.group(3), 16) & 1)
+
+
+def format_traceparent(span: Span | NonRecordingSpan) -> str:
+    flags = "01" if span.sampled else "00"
+    return f"00-{span.trace_id:032x}-{span.span_id:016x}-{flags}"
+
+
+class SpanExporter(Protocol):
+    def export(self, span: dict) -> None: ...
+
+
+class InMemorySpanExporter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.spans: list[dict] = []
+
+    def export(self, span: dict) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class FileSpanExporter:
+    """JSON Lines: по спану на строку, пригодно для офлайн-разбора."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span, default=str, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+
+
+def load_exporter(spec: str, file_path: str) -> Optional[SpanExporter]:
+    """
+    none | memory | file | "package.module:factory" для своего экспортёра
+    (например, адаптера к opentelemetry-sdk).
+    """
+    if spec == "none":
+        return None
+    if spec == "memory":
+        return InMemorySpanExporter()
+    if spec == "file":
+        return FileSpanExporter(file_path)
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.exporter: Optional[SpanExporter] = None
+        self.sample_ratio = 0.0
+        self._threshold = 0
+
+    def configure(self, exporter: Optional[SpanExporter], sample_ratio: float) -> None:
+        self.exporter = exporter
+        self.sample_ratio = min(max(sample_ratio, 0.0), 1.0)
+        # Как TraceIdRatioBased в OpenTelemetry: решение по младшим 64 битам
+        # trace id, одинаковое во всех сервисах с тем же ratio.
+        self._threshold = int(self.sample_ratio * (1 << 64))
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _should_sample(self, trace_id: int) -> bool:
+        return (trace_id & 0xFFFFFFFFFFFFFFFF) < self._threshold
+
+    def start_root(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[dict] = None,
+    ) -> Span | NonRecordingSpan:
+        parent = parse_traceparent(traceparent)
+        if parent is None:
+            trace_id = random.getrandbits(128) or 1
+            parent_id, sampled = None, self._should_sample(trace_id)
+        else:
+            # Parent-based: решение о выборке принимает тот, кто начал трейс.
+            trace_id, parent_id, sampled = parent
+
+        if not sampled or self.exporter is None:
+            return NonRecordingSpan(trace_id, random.getrandbits(64) or 1)
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def start_span(
+        self, name: str, attributes: Optional[dict] = None
+    ) -> Optional[Span | NonRecordingSpan]:
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return parent
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[dict] = None) -> Iterator[Any]:
+        span = self.start_span(name, attributes)
+        if span is None or not span.sampled:
+            yield span
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _export(self, span: Span) -> None:
+        exporter = self.exporter
+        if exporter is not None:
+            exporter.export(span.to_dict())
+
+
+tracer = Tracer()
+
+
+def instrument_engine(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# Спан запроса живёт на ExecutionContext, как и время старта в profiling:
+# список в conn.info пережил бы возврат соединения в пул, и незакрытый спан
+# достался бы чужому запросу.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span(
+        "db.query",
+        {
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:_MAX_STATEMENT_LENGTH],
+        },
+    )
+    if context is not None and span is not None and span.sampled:
+        context._trace_span = span
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.end()
+
+
+def _handle_error(exception_context) -> None:
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+
+class TracingMiddleware:
+    """
+    Серверный спан на каждый запрос: продолжает входящий traceparent или
+    начинает новый трейс по sample ratio, и возвращает traceparent в ответе.
+    Имя спана — шаблон маршрута, известный только после роутинга. Сам путь
+    не записывается: в нём бывают секреты (/shared/{token}).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        span = tracer.start_root(
+            f"HTTP {method}",
+            Headers(scope=scope).get("traceparent"),
+            {"http.method": method},
+        )
+        token = _current_span.set(span)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_status("ERROR")
+                MutableHeaders(scope=message)["traceparent"] = format_traceparent(span)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None and span.sampled:
+                span.name = f"HTTP {method} {route}"
+                span.set_attribute("http.route", route)
+            span.end()
@@ -1,6 +1,7 @@
 from typing import Generator
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from app.core.config import settings
@@ -10,10 +11,22 @@ class Base(DeclarativeBase):
     pass
 
 
+def _connect_args(database_url: str) -> dict:
+    # psycopg (v3) умеет серверные prepared statements: после prepare_threshold
+    # выполнений запрос готовится на стороне Postgres. psycopg2 так не умеет,
+    # для него остаётся только кеш скомпилированных запросов SQLAlchemy.
+    url = make_url(database_url)
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg":
+        return {"prepare_threshold": settings.db_prepare_threshold}
+    return {}
+
+
 engine = create_engine(
     settings.database_url,
     future=True,
     echo=False,
+    query_cache_size=settings.db_query_cache_size,
+    connect_args=_connect_args(settings.database_url),
 )
 
 SessionLocal = sessionmaker(
@@ -3,10 +3,16 @@ from __future__ import annotations
 from typing import Dict, List
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from app.core import tracing
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings
 from app.core.errors import ApiError, register_exception_handlers
+from app.core.metrics import render_metrics
+from app.core.profiling import LatencyMiddleware, exchange, instrument_engine
 from app.database import Base, engine
-from app.routers import auth, wishes
+from app.routers import admin, auth, sharing, wishes
 
 _ITEMS_DB: Dict[str, List[dict]] = {"items": []}
 
@@ -19,14 +25,45 @@ def create_app() -> FastAPI:
 
     register_exception_handlers(app)
 
+    if settings.compression_enabled:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_minimum_size,
+            gzip_level=settings.compression_gzip_level,
+            brotli_quality=settings.compression_brotli_quality,
+            zstd_level=settings.compression_zstd_level,
+        )
+
+    tracing.tracer.configure(
+        tracing.load_exporter(settings.tracing_exporter, settings.tracing_file_path),
+        settings.tracing_sample_ratio,
+    )
+    tracing.instrument_engine(engine)
+    app.add_middleware(tracing.TracingMiddleware)
+
+    # Добавлен последним — самый внешний: в задержку входит и сжатие.
+    instrument_engine(engine)
+    app.add_middleware(LatencyMiddleware)
+    exchange.configure(settings.profiler_dir or None, settings.profiler_poll_seconds)
+
     @app.on_event("startup")
     def on_startup() -> None:
         Base.metadata.create_all(bind=engine)
+        # Запускается в каждом воркере: startup выполняется после fork.
+        exchange.start()
+
+    @app.on_event("shutdown")
+    def on_shutdown() -> None:
+        exchange.stop()
 
     @app.get("/health")
     def health() -> dict:
         return {"status": "ok"}
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics() -> str:
+        return render_metrics()
+
     @app.post("/items")
     def create_item(name: str) -> dict:
         if not name or len(name) > 100:
@@ -54,6 +91,8 @@ def create_app() -> FastAPI:
 
     app.include_router(auth.router)
     app.include_router(wishes.router, prefix="/wishes")
+    app.include_router(sharing.router)
+    app.include_router(admin.router)
 
     return app
 
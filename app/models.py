@@ -1,15 +1,33 @@
 from datetime import datetime, timezone
 
 from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy.engine import make_url
+from sqlalchemy.event import listen
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.schema import DDL
 
+from app.core.config import settings
 from app.database import Base
 
+# Hash-партиционирование wishes по owner_id (только Postgres). Ключ
+# партиционирования обязан входить в первичный ключ, поэтому в этом режиме
+# PK составной (id, owner_id). Действует при создании схемы: существующую
+# таблицу create_all не перестраивает.
+WISHES_PARTITIONED = (
+    settings.wishes_partitions > 0
+    and make_url(settings.database_url).get_backend_name() == "postgresql"
+)
+
 
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def as_utc(value: datetime) -> datetime:
+    # SQLite отдаёт naive datetime даже для DateTime(timezone=True).
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -31,8 +49,18 @@ class User(Base):
 
 class Wish(Base):
     __tablename__ = "wishes"
+    # sqlite_autoincrement: id архивированных желаний не выдаются повторно,
+    # иначе восстановление из wishes_archive столкнулось бы с новым желанием.
+    __table_args__ = {
+        "sqlite_autoincrement": True,
+        **(
+            {"postgresql_partition_by": "HASH (owner_id)"} if WISHES_PARTITIONED else {}
+        ),
+    }
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, index=True, autoincrement=True
+    )
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     link: Mapped[str | None] = mapped_column(String(500), nullable=True)
     price_estimate: Mapped[Numeric] = mapped_column(Numeric(10, 2), nullable=False)
@@ -41,6 +69,7 @@ class Wish(Base):
     owner_id: Mapped[int] = mapped_column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=WISHES_PARTITIONED,
         nullable=False,
         index=True,
     )
@@ -60,3 +89,141 @@ class Wish(Base):
     )
 
     owner: Mapped[User] = relationship(back_populates="wishes")
+
+
+def _create_wish_partitions(target, connection, **kw) -> None:
+    modulus = settings.wishes_partitions
+    for remainder in range(modulus):
+        connection.execute(
+            DDL(
+                f"CREATE TABLE IF NOT EXISTS wishes_p{remainder} PARTITION OF wishes "
+                f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+            )
+        )
+
+
+if WISHES_PARTITIONED:
+    listen(Wish.__table__, "after_create", _create_wish_partitions)
+
+
+class WishArchive(Base):
+    """Холодные желания, давно не менявшиеся; id сохраняется при переносе."""
+
+    __tablename__ = "wishes_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(200), nullable=False)
+    link: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    price_estimate: Mapped[Numeric] = mapped_column(Numeric(10, 2), nullable=False)
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    owner_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    is_favorite: Mapped[bool] = mapped_column(Boolean, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=utcnow,
+        nullable=False,
+    )
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    token_id: Mapped[str] = mapped_column(String(32), unique=True, index=True)
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=utcnow,
+        nullable=False,
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    revoked_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    replaced_by: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+
+class LinkMetadata(Base):
+    __tablename__ = "link_metadata"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    url: Mapped[str] = mapped_column(String(500), unique=True, index=True)
+    title: Mapped[str | None] = mapped_column(String(300), nullable=True)
+    image_url: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    price: Mapped[Numeric | None] = mapped_column(Numeric(10, 2), nullable=True)
+    currency: Mapped[str | None] = mapped_column(String(8), nullable=True)
+    error: Mapped[str | None] = mapped_column(String(200), nullable=True)
+
+    fetched_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=utcnow,
+        nullable=False,
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        index=True,
+    )
+
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+
+    key_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Сохраняем только JSON-ответы, поэтому тело — текст.
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        index=True,
+    )
+
+
+class WishlistShare(Base):
+    __tablename__ = "wishlist_shares"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    token_id: Mapped[str] = mapped_column(String(32), unique=True, index=True)
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    owner_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=utcnow,
+        nullable=False,
+    )
+    revoked_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
@@ -0,0 +1,149 @@
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import StatementLambdaElement, func, lambda_stmt, select, union_all
+from sqlalchemy.orm import aliased
+
+from app import models, schemas
+
+# Горячие запросы собраны как lambda-statements: SQLAlchemy кеширует их по месту
+# объявления лямбды, поэтому на каждый запрос не строится дерево выражения и не
+# считается полный cache key — только подставляются связанные параметры.
+# Каждый вариант запроса — одна лямбда: цепочки `stmt += ...` заново извлекают
+# параметры всей цепочки и съедают выигрыш.
+
+Wish = models.Wish
+
+# Все желания владельца — горячие и архивные. Списки и счётчики идут по
+# UNION ALL двух таблиц: условие по owner_id Postgres и SQLite проталкивают
+# в каждую ветку, так что это два индексных поиска, а архивация для
+# владельца незаметна.
+_all_wishes = union_all(
+    select(*Wish.__table__.c),
+    select(*(models.WishArchive.__table__.c[c.name] for c in Wish.__table__.c)),
+).subquery("all_wishes")
+AllWishes = aliased(Wish, _all_wishes)
+
+# Колонки, которые нужны WishRead: проекция отдаёт их плоскими строками (Row),
+# без сборки ORM-сущностей и identity map.
+WISH_READ_COLUMNS = tuple(
+    getattr(AllWishes, name) for name in schemas.WishRead.model_fields
+)
+SHARED_WISH_COLUMNS = tuple(
+    getattr(AllWishes, name) for name in schemas.SharedWishRead.model_fields
+)
+
+
+def user_by_id(user_id: int) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(models.User).where(models.User.id == user_id))
+
+
+def refresh_token_by_id(token_id: str) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(models.RefreshToken).where(
+            models.RefreshToken.token_id == token_id
+        )
+    )
+
+
+def wish_by_id(wish_id: int, owner_id: int) -> StatementLambdaElement:
+    # owner_id в условии — ключ секционирования: Postgres отсекает остальные
+    # секции и ищет в одной.
+    return lambda_stmt(
+        lambda: select(Wish).where(Wish.id == wish_id, Wish.owner_id == owner_id)
+    )
+
+
+def archived_wish_by_id(wish_id: int, owner_id: int) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(models.WishArchive).where(
+            models.WishArchive.id == wish_id,
+            models.WishArchive.owner_id == owner_id,
+        )
+    )
+
+
+def wish_owner_id(wish_id: int) -> StatementLambdaElement:
+    # Запасной поиск по одному id (по всем секциям): только чтобы отличить
+    # чужое желание (403) от несуществующего (404).
+    return lambda_stmt(
+        lambda: select(AllWishes.owner_id).where(AllWishes.id == wish_id)
+    )
+
+
+def share_by_token_id(token_id: str) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(models.WishlistShare).where(
+            models.WishlistShare.token_id == token_id
+        )
+    )
+
+
+def owner_wishes_rows(owner_id: int) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(*SHARED_WISH_COLUMNS).where(AllWishes.owner_id == owner_id)
+    )
+
+
+def wishes_count(
+    owner_id: int,
+    price_lt: Optional[Decimal] = None,
+) -> StatementLambdaElement:
+    if price_lt is None:
+        return lambda_stmt(
+            lambda: select(func.count(AllWishes.id)).where(
+                AllWishes.owner_id == owner_id
+            )
+        )
+    return lambda_stmt(
+        lambda: select(func.count(AllWishes.id)).where(
+            AllWishes.owner_id == owner_id,
+            AllWishes.price_estimate < price_lt,
+        )
+    )
+
+
+def wishes_page(
+    owner_id: int,
+    limit: int,
+    offset: int,
+    price_lt: Optional[Decimal] = None,
+) -> StatementLambdaElement:
+    if price_lt is None:
+        return lambda_stmt(
+            lambda: select(AllWishes)
+            .where(AllWishes.owner_id == owner_id)
+            .order_by(AllWishes.created_at.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+    return lambda_stmt(
+        lambda: select(AllWishes)
+        .where(AllWishes.owner_id == owner_id, AllWishes.price_estimate < price_lt)
+        .order_by(AllWishes.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+def wishes_page_rows(
+    owner_id: int,
+    limit: int,
+    offset: int,
+    price_lt: Optional[Decimal] = None,
+) -> StatementLambdaElement:
+    if price_lt is None:
+        return lambda_stmt(
+            lambda: select(*WISH_READ_COLUMNS)
+            .where(AllWishes.owner_id == owner_id)
+            .order_by(AllWishes.created_at.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+    return lambda_stmt(
+        lambda: select(*WISH_READ_COLUMNS)
+        .where(AllWishes.owner_id == owner_id, AllWishes.price_estimate < price_lt)
+        .order_by(AllWishes.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
@@ -0,0 +1,53 @@
+import os
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app import models
+from app.core.config import settings
+from app.core.errors import ApiError
+from app.core.profiling import exchange, profiler
+from app.core.security import get_current_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    responses={
+        200: {
+            "description": "Collapsed stacks of every worker watching "
+            "PROFILER_DIR (or only of the worker that served the request when "
+            "it is unset). Each stack is rooted at pid-<pid>; the profiled "
+            "pids are listed in X-Profiler-Pids.",
+        }
+    },
+)
+def run_profiler(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    current_admin: models.User = Depends(get_current_admin),
+) -> PlainTextResponse:
+    if seconds > settings.profiler_max_seconds:
+        raise ApiError(
+            code="validation_error",
+            message=f"seconds must be <= {settings.profiler_max_seconds}",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    if exchange.enabled:
+        dumps = exchange.collect(seconds, interval_ms / 1000)
+    else:
+        collapsed = profiler.profile(seconds, interval_ms / 1000)
+        dumps = None if collapsed is None else {os.getpid(): collapsed}
+    if dumps is None:
+        raise ApiError(
+            code="profiler_busy",
+            message="Another profiling session is running",
+            status_code=status.HTTP_409_CONFLICT,
+        )
+    return PlainTextResponse(
+        "".join(dumps.values()),
+        headers={"X-Profiler-Pids": ",".join(map(str, dumps))},
+    )
@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, status
+from fastapi.responses import Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.core.errors import ApiError
-from app.core.security import create_access_token, get_password_hash, verify_password
+from app.core.idempotency import Idempotency, get_idempotency
+from app.core.profiling import phase
+from app.core.security import (
+    create_access_token,
+    create_refresh_token,
+    get_password_hash,
+    revoke_refresh_token,
+    rotate_refresh_token,
+    verify_and_update,
+)
+from app.core.tracing import tracer
 from app.database import get_db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -17,33 +30,42 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 def register_user(
     user_in: schemas.UserCreate,
     db: Session = Depends(get_db),
-) -> schemas.UserRead:
-    existing = (
-        db.query(models.User)
-        .filter(
-            or_(
-                models.User.email == user_in.email,
-                models.User.username == user_in.username,
+    idempotency: Idempotency = Depends(get_idempotency),
+    idempotency_key: Optional[str] = Header(None),
+) -> Response:
+    def handle() -> Tuple[int, bytes]:
+        existing = (
+            db.query(models.User)
+            .filter(
+                or_(
+                    models.User.email == user_in.email,
+                    models.User.username == user_in.username,
+                )
             )
+            .first()
         )
-        .first()
-    )
-    if existing:
-        raise ApiError(
-            code="user_exists",
-            message="User with this email or username already exists",
-            status_code=status.HTTP_400_BAD_REQUEST,
+        if existing:
+            raise ApiError(
+                code="user_exists",
+                message="User with this email or username already exists",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = models.User(
+            email=user_in.email,
+            username=user_in.username,
+            hashed_password=get_password_hash(user_in.password),
         )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        with phase("serialization"), tracer.span("serialization"):
+            body = schemas.UserRead.model_validate(user).model_dump_json().encode()
+        return status.HTTP_201_CREATED, body
 
-    user = models.User(
-        email=user_in.email,
-        username=user_in.username,
-        hashed_password=get_password_hash(user_in.password),
+    return idempotency.run(
+        "register", idempotency_key, user_in.model_dump_json(), handle
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
 
 
 @router.post("/login", response_model=schemas.Token)
@@ -62,12 +84,42 @@ def login(
         .first()
     )
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = verify_and_update(form_data.password, user.hashed_password)
+    if not verified:
         raise ApiError(
             code="invalid_credentials",
             message="Incorrect username or password",
             status_code=status.HTTP_401_UNAUTHORIZED,
         )
 
+    if new_hash is not None:
+        user.hashed_password = new_hash
+
     access_token = create_access_token(subject=user.id)
-    return schemas.Token(access_token=access_token)
+    refresh_token = create_refresh_token(db, user.id)
+    db.commit()
+    return schemas.Token(access_token=access_token, refresh_token=refresh_token)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+def refresh(
+    body: schemas.RefreshRequest,
+    db: Session = Depends(get_db),
+) -> schemas.Token:
+    user_id, refresh_token = rotate_refresh_token(db, body.refresh_token)
+    db.commit()
+    return schemas.Token(
+        access_token=create_access_token(subject=user_id),
+        refresh_token=refresh_token,
+    )
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    body: schemas.RefreshRequest,
+    db: Session = Depends(get_db),
+) -> None:
+    revoke_refresh_token(db, body.refresh_token)
+    db.commit()
@@ -0,0 +1,91 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Path, status
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.core.compression import strip_encoding_suffix
+from app.core.config import settings
+from app.core.errors import ApiError
+from app.core.security import get_current_user
+from app.core.sharing import SharedLists, create_share, get_shared_lists
+from app.database import get_db
+
+router = APIRouter(tags=["sharing"])
+
+
+def _share_not_found() -> ApiError:
+    return ApiError(
+        code="share_not_found",
+        message="Shared wishlist not found",
+        status_code=status.HTTP_404_NOT_FOUND,
+    )
+
+
+def _matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    Тег из If-None-Match, совпавший с ETag снимка. Сжатые ответы несут
+    ETag с суффиксом кодировки ("<hash>-gzip"): он совпадает с тем же
+    снимком. Сравнение слабое, как положено для If-None-Match.
+    """
+    if if_none_match is None:
+        return None
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*":
+            return etag
+        if strip_encoding_suffix(tag) == etag:
+            return tag
+    return None
+
+
+@router.post(
+    "/wishes/shares",
+    response_model=schemas.ShareCreated,
+    status_code=status.HTTP_201_CREATED,
+)
+def create_wishlist_share(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> schemas.ShareCreated:
+    share, token = create_share(db, current_user.id)
+    return schemas.ShareCreated(id=share.token_id, token=token, url=f"/shared/{token}")
+
+
+@router.delete("/wishes/shares/{share_id}", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_wishlist_share(
+    share_id: str = Path(..., max_length=32),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    shared_lists: SharedLists = Depends(get_shared_lists),
+) -> None:
+    if not shared_lists.revoke(db, current_user.id, share_id):
+        raise _share_not_found()
+
+
+@router.get(
+    "/shared/{token}",
+    response_model=schemas.SharedWishListResponse,
+    responses={304: {"description": "Not Modified"}},
+)
+def get_shared_wishlist(
+    token: str = Path(..., max_length=100),
+    if_none_match: Optional[str] = Header(None),
+    shared_lists: SharedLists = Depends(get_shared_lists),
+) -> Response:
+    snapshot = shared_lists.get(token)
+    if snapshot is None:
+        raise _share_not_found()
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={settings.share_max_age_seconds}",
+    }
+    matched = _matching_etag(if_none_match, snapshot.etag)
+    if matched is not None:
+        # 304 несёт ETag того представления, что уже есть у клиента.
+        headers["ETag"] = matched
+        headers["Vary"] = "Accept-Encoding"
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(snapshot.body, headers=headers, media_type="application/json")
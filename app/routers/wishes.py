@@ -1,17 +1,44 @@
 from decimal import Decimal
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Query, status
-from sqlalchemy import func
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Query, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import models, queries, schemas
+from app.core import archival, link_preview
+from app.core.config import settings
 from app.core.errors import ApiError
+from app.core.idempotency import Idempotency, get_idempotency
+from app.core.profiling import phase
 from app.core.security import get_current_user
+from app.core.sharing import shared_lists
+from app.core.singleflight import SingleFlight, singleflight_shared_total
+from app.core.tracing import tracer
 from app.database import get_db
 
 router = APIRouter(tags=["wishes"])
 
+# Одинаковые одновременные чтения одного владельца (несколько устройств,
+# ретраи клиента) выполняют один запрос к БД и одну сериализацию.
+read_flights = SingleFlight()
+
+
+def _coalesced_json(key: tuple, load) -> Response:
+    body, shared = read_flights.do(key, load)
+    if shared:
+        singleflight_shared_total.inc(route=key[1])
+    return Response(content=body, media_type="application/json")
+
+
+def _wishes_changed(
+    owner_id: int,
+    saved: Optional[models.Wish] = None,
+    removed: Optional[int] = None,
+) -> None:
+    read_flights.forget(owner_id)
+    shared_lists.wishes_changed(owner_id, saved=saved, removed=removed)
+
 
 @router.post(
     "",
@@ -20,20 +47,38 @@ router = APIRouter(tags=["wishes"])
 )
 def create_wish(
     wish_in: schemas.WishCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
-) -> schemas.WishRead:
-    wish = models.Wish(
-        title=wish_in.title,
-        link=wish_in.link,
-        price_estimate=wish_in.price_estimate,
-        notes=wish_in.notes,
-        owner_id=current_user.id,
+    link_previews: Optional[link_preview.LinkPreviewService] = Depends(
+        link_preview.get_link_previews
+    ),
+    idempotency: Idempotency = Depends(get_idempotency),
+    idempotency_key: Optional[str] = Header(None),
+) -> Response:
+    def handle() -> Tuple[int, bytes]:
+        wish = models.Wish(
+            title=wish_in.title,
+            link=wish_in.link,
+            price_estimate=wish_in.price_estimate,
+            notes=wish_in.notes,
+            owner_id=current_user.id,
+        )
+        db.add(wish)
+        db.commit()
+        db.refresh(wish)
+        _wishes_changed(current_user.id, saved=wish)
+        _schedule_link_preview(wish, background_tasks, link_previews)
+        with phase("serialization"), tracer.span("serialization"):
+            body = schemas.WishRead.model_validate(wish).model_dump_json().encode()
+        return status.HTTP_201_CREATED, body
+
+    return idempotency.run(
+        f"create_wish:{current_user.id}",
+        idempotency_key,
+        wish_in.model_dump_json(),
+        handle,
     )
-    db.add(wish)
-    db.commit()
-    db.refresh(wish)
-    return wish
 
 
 @router.get("", response_model=schemas.WishListResponse)
@@ -47,23 +92,81 @@ def list_wishes(
         ge=0,
         description="Вернуть желания с ценой строго меньше указанной",
     ),
-) -> schemas.WishListResponse:
-    query = db.query(models.Wish).filter(models.Wish.owner_id == current_user.id)
+) -> Response:
+    def load() -> bytes:
+        total = (
+            db.execute(queries.wishes_count(current_user.id, price_lt)).scalar() or 0
+        )
 
-    if price_lt is not None:
-        query = query.filter(models.Wish.price_estimate < price_lt)
+        if settings.wishes_list_projection:
+            rows = db.execute(
+                queries.wishes_page_rows(current_user.id, limit, offset, price_lt)
+            ).all()
+            with phase("serialization"), tracer.span("serialization"):
+                # Строки из БД уже валидны — model_construct без повторной
+                # валидации, как в stream_wishes.
+                page = schemas.WishListResponse.model_construct(
+                    items=[
+                        schemas.WishRead.model_construct(**r._asdict()) for r in rows
+                    ],
+                    total=total,
+                    limit=limit,
+                    offset=offset,
+                )
+                return page.model_dump_json().encode()
 
-    total = query.with_entities(func.count(models.Wish.id)).scalar() or 0
+        items = (
+            db.execute(queries.wishes_page(current_user.id, limit, offset, price_lt))
+            .scalars()
+            .all()
+        )
+        with phase("serialization"), tracer.span("serialization"):
+            page = schemas.WishListResponse.model_validate(
+                {"items": items, "total": total, "limit": limit, "offset": offset}
+            )
+            return page.model_dump_json().encode()
 
-    items = (
-        query.order_by(models.Wish.created_at.desc()).offset(offset).limit(limit).all()
-    )
+    # Decimal("10") и Decimal("10.00") равны и дают один ключ.
+    key = (current_user.id, "list_wishes", limit, offset, price_lt)
+    return _coalesced_json(key, load)
+
+
+@router.get(
+    "/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+def stream_wishes(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    price_lt: Optional[Decimal] = Query(
+        None,
+        ge=0,
+        description="Вернуть желания с ценой строго меньше указанной",
+    ),
+) -> StreamingResponse:
+    total = db.execute(queries.wishes_count(current_user.id, price_lt)).scalar() or 0
+    # Строки выбираем сразу: сессия из get_db закрывается до отправки тела.
+    rows = db.execute(
+        queries.wishes_page_rows(current_user.id, limit, offset, price_lt)
+    ).all()
+
+    def lines() -> Iterator[bytes]:
+        for row in rows:
+            # Данные из БД уже валидны — model_construct без повторной валидации.
+            item = schemas.WishRead.model_construct(**row._asdict())
+            yield item.model_dump_json().encode() + b"\n"
 
-    return schemas.WishListResponse(
-        items=items,
-        total=total,
-        limit=limit,
-        offset=offset,
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={
+            "X-Total-Count": str(total),
+            "X-Limit": str(limit),
+            "X-Offset": str(offset),
+        },
     )
 
 
@@ -71,41 +174,71 @@ def _get_wish_or_error(
     wish_id: int,
     db: Session,
     current_user: models.User,
-) -> models.Wish:
-    wish = db.get(models.Wish, wish_id)
+    restore: bool = False,
+) -> models.Wish | models.WishArchive:
+    """
+    Желание из горячей таблицы или, прозрачно, из архива. Чтение архивную
+    строку отдаёт как есть; restore=True возвращает её в горячую таблицу —
+    это нужно только изменению.
+    """
+    owner_id = current_user.id
+    wish = db.execute(queries.wish_by_id(wish_id, owner_id)).scalar_one_or_none()
+    if wish is None:
+        wish = db.execute(
+            queries.archived_wish_by_id(wish_id, owner_id)
+        ).scalar_one_or_none()
+    if wish is None and db.execute(queries.wish_owner_id(wish_id)).first():
+        raise ApiError(
+            code="forbidden",
+            message="You do not own this wish",
+            status_code=status.HTTP_403_FORBIDDEN,
+        )
+    if restore and isinstance(wish, models.WishArchive):
+        wish = archival.restore_wish(db, wish_id, owner_id)
     if not wish:
         raise ApiError(
             code="wish_not_found",
             message="Wish not found",
             status_code=status.HTTP_404_NOT_FOUND,
         )
-    if wish.owner_id != current_user.id:
-        raise ApiError(
-            code="forbidden",
-            message="You do not own this wish",
-            status_code=status.HTTP_403_FORBIDDEN,
-        )
     return wish
 
 
+def _schedule_link_preview(
+    wish: models.Wish,
+    background_tasks: BackgroundTasks,
+    link_previews: Optional[link_preview.LinkPreviewService],
+) -> None:
+    if link_previews is not None and wish.link:
+        background_tasks.add_task(link_previews.enrich, wish.link)
+
+
 @router.get("/{wish_id}", response_model=schemas.WishRead)
 def get_wish(
     wish_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
-) -> schemas.WishRead:
-    wish = _get_wish_or_error(wish_id, db, current_user)
-    return wish
+) -> Response:
+    def load() -> bytes:
+        wish = _get_wish_or_error(wish_id, db, current_user)
+        with phase("serialization"), tracer.span("serialization"):
+            return schemas.WishRead.model_validate(wish).model_dump_json().encode()
+
+    return _coalesced_json((current_user.id, "get_wish", wish_id), load)
 
 
 @router.put("/{wish_id}", response_model=schemas.WishRead)
 def update_wish(
     wish_id: int,
     wish_update: schemas.WishUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
+    link_previews: Optional[link_preview.LinkPreviewService] = Depends(
+        link_preview.get_link_previews
+    ),
 ) -> schemas.WishRead:
-    wish = _get_wish_or_error(wish_id, db, current_user)
+    wish = _get_wish_or_error(wish_id, db, current_user, restore=True)
 
     data = wish_update.model_dump(exclude_unset=True)
     for field, value in data.items():
@@ -114,15 +247,45 @@ def update_wish(
     db.add(wish)
     db.commit()
     db.refresh(wish)
+    _wishes_changed(current_user.id, saved=wish)
+    if "link" in data:
+        _schedule_link_preview(wish, background_tasks, link_previews)
     return wish
 
 
+@router.get("/{wish_id}/link-preview", response_model=schemas.LinkPreviewRead)
+def get_wish_link_preview(
+    wish_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    link_previews: Optional[link_preview.LinkPreviewService] = Depends(
+        link_preview.get_link_previews
+    ),
+) -> schemas.LinkPreviewRead:
+    wish = _get_wish_or_error(wish_id, db, current_user)
+
+    record = link_preview.lookup_preview(db, wish.link) if wish.link else None
+    if record is None or not link_preview.is_fresh(record):
+        # Устаревшую запись отдаём как есть и обновляем в фоне.
+        _schedule_link_preview(wish, background_tasks, link_previews)
+    if record is None or record.error is not None:
+        raise ApiError(
+            code="link_preview_not_found",
+            message="Link preview is not available yet",
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return record
+
+
 @router.delete("/{wish_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_wish(
     wish_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ) -> None:
+    # Архивное желание удаляется прямо из архива, без переноса обратно.
     wish = _get_wish_or_error(wish_id, db, current_user)
     db.delete(wish)
     db.commit()
+    _wishes_changed(current_user.id, removed=wish_id)
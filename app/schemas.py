@@ -24,6 +24,11 @@ class UserRead(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=200)
 
 
 class TokenPayload(BaseModel):
@@ -70,8 +75,41 @@ class WishRead(WishBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SharedWishRead(WishBase):
+    """Желание в публичном снимке: без owner_id."""
+
+    id: int
+    is_favorite: bool
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SharedWishListResponse(BaseModel):
+    items: list[SharedWishRead]
+    total: int
+
+
+class ShareCreated(BaseModel):
+    id: str
+    token: str
+    url: str
+
+
 class WishListResponse(BaseModel):
     items: list[WishRead]
     total: int
     limit: int
     offset: int
+
+
+class LinkPreviewRead(BaseModel):
+    url: str
+    title: Optional[str] = None
+    image_url: Optional[str] = None
+    price: Optional[Decimal] = None
+    currency: Optional[str] = None
+    fetched_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
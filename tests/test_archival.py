@@ -0,0 +1,148 @@
+import json
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.archival import archive_stale_wishes
+from app.core.config import settings
+from tests.test_wishes import register_and_login
+
+WISH = {"title": "x", "link": "", "price_estimate": "1.00", "notes": ""}
+
+
+def _create_wishes(client: TestClient, headers: dict, count: int) -> list[int]:
+    return [
+        client.post("/wishes", json={**WISH, "title": f"w{i}"}, headers=headers).json()[
+            "id"
+        ]
+        for i in range(count)
+    ]
+
+
+def _make_stale(db: Session, ids: list[int]) -> None:
+    db.execute(
+        update(models.Wish)
+        .where(models.Wish.id.in_(ids))
+        .values(updated_at=models.utcnow() - timedelta(days=400))
+    )
+    db.commit()
+
+
+def test_archive_moves_only_stale_wishes(
+    client: TestClient, db_session: Session
+) -> None:
+    headers = register_and_login(client, idx=1)
+    stale = _create_wishes(client, headers, 3)
+    fresh = _create_wishes(client, headers, 1)
+    _make_stale(db_session, stale)
+
+    moved = archive_stale_wishes(db_session, timedelta(days=365), batch_size=2)
+
+    assert moved == 3
+    hot = db_session.execute(select(models.Wish.id)).scalars().all()
+    cold = db_session.execute(select(models.WishArchive.id)).scalars().all()
+    assert hot == fresh
+    assert sorted(cold) == stale
+
+
+def test_lists_include_archived_wishes(
+    client: TestClient, db_session: Session, monkeypatch
+) -> None:
+    headers = register_and_login(client, idx=1)
+    ids = _create_wishes(client, headers, 3)
+    _make_stale(db_session, ids[:2])
+    archive_stale_wishes(db_session, timedelta(days=365))
+
+    newest_first = list(reversed(ids))
+    for projection in (True, False):
+        monkeypatch.setattr(settings, "wishes_list_projection", projection)
+        page = client.get("/wishes", headers=headers).json()
+        assert page["total"] == 3
+        assert [item["id"] for item in page["items"]] == newest_first
+
+    r = client.get("/wishes/stream", headers=headers)
+    assert r.headers["x-total-count"] == "3"
+    assert [json.loads(line)["id"] for line in r.text.splitlines()] == newest_first
+
+    # Список архивные желания только читает, не восстанавливает.
+    archived = db_session.execute(select(models.WishArchive.id)).scalars().all()
+    assert sorted(archived) == ids[:2]
+
+
+def test_get_reads_archived_wish_without_restoring(
+    client: TestClient, db_session: Session
+) -> None:
+    headers = register_and_login(client, idx=1)
+    (wish_id,) = _create_wishes(client, headers, 1)
+    _make_stale(db_session, [wish_id])
+    archive_stale_wishes(db_session, timedelta(days=365))
+    archived_at = db_session.execute(select(models.WishArchive.updated_at)).scalar()
+
+    r = client.get(f"/wishes/{wish_id}", headers=headers)
+
+    assert r.status_code == 200
+    assert r.json()["title"] == "w0"
+    db_session.expire_all()
+    archived = db_session.execute(select(models.WishArchive)).scalars().all()
+    assert [wish.id for wish in archived] == [wish_id]
+    assert archived[0].updated_at == archived_at
+    assert db_session.execute(select(models.Wish.id)).first() is None
+
+
+def test_update_restores_archived_wish(client: TestClient, db_session: Session) -> None:
+    headers = register_and_login(client, idx=1)
+    (wish_id,) = _create_wishes(client, headers, 1)
+    _make_stale(db_session, [wish_id])
+    archive_stale_wishes(db_session, timedelta(days=365))
+
+    r = client.put(f"/wishes/{wish_id}", json={"title": "new"}, headers=headers)
+
+    assert r.status_code == 200
+    assert r.json()["title"] == "new"
+    assert db_session.execute(select(models.WishArchive.id)).first() is None
+    assert client.get("/wishes", headers=headers).json()["total"] == 1
+
+    # Изменённое желание — снова горячее: следующий запуск его не трогает.
+    assert archive_stale_wishes(db_session, timedelta(days=365)) == 0
+
+
+def test_delete_removes_archived_wish(client: TestClient, db_session: Session) -> None:
+    headers = register_and_login(client, idx=1)
+    (wish_id,) = _create_wishes(client, headers, 1)
+    _make_stale(db_session, [wish_id])
+    archive_stale_wishes(db_session, timedelta(days=365))
+
+    assert client.delete(f"/wishes/{wish_id}", headers=headers).status_code == 204
+    assert client.get(f"/wishes/{wish_id}", headers=headers).status_code == 404
+    assert db_session.execute(select(models.WishArchive.id)).first() is None
+
+
+def test_archived_wish_of_another_user_stays_archived(
+    client: TestClient, db_session: Session
+) -> None:
+    owner = register_and_login(client, idx=1)
+    other = register_and_login(client, idx=2)
+    (wish_id,) = _create_wishes(client, owner, 1)
+    _make_stale(db_session, [wish_id])
+    archive_stale_wishes(db_session, timedelta(days=365))
+
+    r = client.get(f"/wishes/{wish_id}", headers=other)
+
+    assert r.status_code == 403
+    archived = db_session.execute(select(models.WishArchive.id)).scalars().all()
+    assert archived == [wish_id]
+
+
+def test_archived_ids_are_not_reused(client: TestClient, db_session: Session) -> None:
+    headers = register_and_login(client, idx=1)
+    (wish_id,) = _create_wishes(client, headers, 1)
+    _make_stale(db_session, [wish_id])
+    archive_stale_wishes(db_session, timedelta(days=365))
+
+    (new_id,) = _create_wishes(client, headers, 1)
+
+    assert new_id > wish_id
+    assert client.get(f"/wishes/{wish_id}", headers=headers).json()["title"] == "w0"
@@ -0,0 +1,115 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware
+from tests.test_wishes import register_and_login
+
+
+def _fill(client: TestClient, headers: dict, count: int = 30) -> None:
+    for i in range(count):
+        r = client.post(
+            "/wishes",
+            json={
+                "title": f"wish-{i}",
+                "link": "",
+                "price_estimate": f"{i}.50",
+                "notes": "очень длинная заметка " * 40,
+            },
+            headers=headers,
+        )
+        assert r.status_code == 201
+
+
+def test_choose_encoding() -> None:
+    middleware = CompressionMiddleware(app=None)
+    assert middleware.choose_encoding("") is None
+    assert middleware.choose_encoding("identity") is None
+    assert middleware.choose_encoding("gzip, deflate") == "gzip"
+    assert middleware.choose_encoding("gzip;q=0, deflate") is None
+    assert middleware.choose_encoding("*") in middleware.codecs
+
+
+def test_large_list_is_gzipped(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    _fill(client, headers)
+
+    plain = client.get(
+        "/wishes?limit=100", headers={**headers, "Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in plain.headers
+
+    # Сырой поток, чтобы httpx не распаковал тело сам.
+    with client.stream(
+        "GET", "/wishes?limit=100", headers={**headers, "Accept-Encoding": "gzip"}
+    ) as r:
+        raw = b"".join(r.iter_raw())
+    assert r.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in r.headers["vary"].lower()
+    assert int(r.headers["content-length"]) == len(raw) < len(plain.content) / 5
+    assert json.loads(gzip.decompress(raw)) == plain.json()
+
+
+def test_small_response_not_compressed(client: TestClient) -> None:
+    r = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert "content-encoding" not in r.headers
+
+
+@pytest.mark.parametrize("encoding", ["br", "zstd"])
+def test_optional_codecs(client: TestClient, encoding: str) -> None:
+    module = pytest.importorskip({"br": "brotli", "zstd": "zstandard"}[encoding])
+    headers = register_and_login(client, idx=1)
+    _fill(client, headers)
+
+    plain = client.get("/wishes?limit=100", headers=headers).json()
+    with client.stream(
+        "GET", "/wishes?limit=100", headers={**headers, "Accept-Encoding": encoding}
+    ) as r:
+        raw = b"".join(r.iter_raw())
+    assert r.headers["content-encoding"] == encoding
+
+    if encoding == "br":
+        body = module.decompress(raw)
+    else:
+        body = module.ZstdDecompressor().decompressobj().decompress(raw)
+    assert json.loads(body) == plain
+
+
+def test_ndjson_stream_matches_list(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    _fill(client, headers)
+
+    page = client.get("/wishes?limit=20&offset=5&price_lt=25", headers=headers).json()
+
+    r = client.get(
+        "/wishes/stream?limit=20&offset=5&price_lt=25",
+        headers={**headers, "Accept-Encoding": "identity"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert r.headers["x-total-count"] == str(page["total"])
+    lines = r.content.decode().splitlines()
+    assert [json.loads(line) for line in lines] == page["items"]
+
+
+def test_ndjson_stream_compressed_incrementally(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    _fill(client, headers, count=5)
+
+    decompressor = zlib.decompressobj(31)
+    received = b""
+    with client.stream(
+        "GET", "/wishes/stream?limit=5", headers={**headers, "Accept-Encoding": "gzip"}
+    ) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert "content-length" not in r.headers
+        for chunk in r.iter_raw():
+            received += decompressor.decompress(chunk)
+            # После каждого чанка уже доступны целые строки — спасибо SYNC_FLUSH.
+            assert received.endswith(b"\n")
+
+    assert len(received.splitlines()) == 5
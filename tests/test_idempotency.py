@@ -0,0 +1,185 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import models
+from app.core.idempotency import (
+    DatabaseIdempotencyStore,
+    Idempotency,
+    MemoryIdempotencyStore,
+    StoredResponse,
+    get_idempotency,
+)
+from app.main import app
+from app.routers import auth
+from tests.test_wishes import register_and_login
+
+WISH = {"title": "Kindle", "link": "", "price_estimate": "120.00", "notes": ""}
+USER = {"email": "idem@example.com", "username": "idem", "password": "password123"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_idempotency():
+    """
+    Своё хранилище на каждый тест, чтобы ключи не переживали очистку БД.
+    """
+    idempotency = Idempotency(MemoryIdempotencyStore(max_entries=100), ttl_seconds=60)
+    app.dependency_overrides[get_idempotency] = lambda: idempotency
+    yield idempotency
+    app.dependency_overrides.pop(get_idempotency, None)
+
+
+@pytest.fixture
+def hash_calls(monkeypatch) -> list:
+    calls = []
+    original = auth.get_password_hash
+
+    def counting_hash(password: str) -> str:
+        calls.append(password)
+        time.sleep(0.1)
+        return original(password)
+
+    monkeypatch.setattr(auth, "get_password_hash", counting_hash)
+    return calls
+
+
+def test_create_wish_replayed(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    keyed = {**headers, "Idempotency-Key": "wish-1"}
+
+    r1 = client.post("/wishes", json=WISH, headers=keyed)
+    r2 = client.post("/wishes", json=WISH, headers=keyed)
+    assert r1.status_code == r2.status_code == 201
+    assert r2.json() == r1.json()
+    assert r2.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in r1.headers
+
+    assert client.get("/wishes", headers=headers).json()["total"] == 1
+
+
+def test_key_reused_with_other_body(client: TestClient) -> None:
+    headers = {**register_and_login(client, idx=1), "Idempotency-Key": "wish-1"}
+    assert client.post("/wishes", json=WISH, headers=headers).status_code == 201
+
+    r = client.post("/wishes", json={**WISH, "title": "Other"}, headers=headers)
+    assert r.status_code == 422
+    assert r.json()["error"]["code"] == "idempotency_key_reused"
+
+
+def test_keys_scoped_per_user(client: TestClient) -> None:
+    headers1 = {**register_and_login(client, idx=1), "Idempotency-Key": "same"}
+    headers2 = {**register_and_login(client, idx=2), "Idempotency-Key": "same"}
+
+    r1 = client.post("/wishes", json=WISH, headers=headers1)
+    r2 = client.post("/wishes", json=WISH, headers=headers2)
+    assert r1.status_code == r2.status_code == 201
+    assert r1.json()["id"] != r2.json()["id"]
+    assert "idempotent-replayed" not in r2.headers
+
+
+def test_register_replay_skips_hashing(client: TestClient, hash_calls: list) -> None:
+    headers = {"Idempotency-Key": "register-1"}
+    r1 = client.post("/auth/register", json=USER, headers=headers)
+    r2 = client.post("/auth/register", json=USER, headers=headers)
+
+    assert r1.status_code == r2.status_code == 201
+    assert r2.json() == r1.json()
+    assert len(hash_calls) == 1
+
+
+def test_concurrent_duplicates_wait_for_first(
+    client: TestClient, hash_calls: list
+) -> None:
+    headers = {"Idempotency-Key": "register-race"}
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = list(
+            pool.map(
+                lambda _: client.post("/auth/register", json=USER, headers=headers),
+                range(3),
+            )
+        )
+
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert len({r.content for r in responses}) == 1
+    assert len(hash_calls) == 1
+
+
+def test_errors_are_not_stored(client: TestClient) -> None:
+    assert client.post("/auth/register", json=USER).status_code == 201
+
+    headers = {"Idempotency-Key": "dup"}
+    r1 = client.post("/auth/register", json=USER, headers=headers)
+    assert r1.status_code == 400
+
+    client.post("/auth/register", json={**USER, "email": "x@example.com"})
+    r2 = client.post("/auth/register", json=USER, headers=headers)
+    assert r2.status_code == 400
+    assert "idempotent-replayed" not in r2.headers
+
+
+def test_invalid_key_rejected(client: TestClient) -> None:
+    r = client.post("/auth/register", json=USER, headers={"Idempotency-Key": "k" * 256})
+    assert r.status_code == 400
+    assert r.json()["error"]["code"] == "invalid_idempotency_key"
+
+
+def test_database_store(client: TestClient, fresh_idempotency: Idempotency) -> None:
+    fresh_idempotency.store = DatabaseIdempotencyStore()
+    headers = {**register_and_login(client, idx=1), "Idempotency-Key": "db-key"}
+
+    r1 = client.post("/wishes", json=WISH, headers=headers)
+    # Новый процесс — пустая память, но ответ лежит в таблице.
+    app.dependency_overrides[get_idempotency] = lambda: Idempotency(
+        DatabaseIdempotencyStore(), ttl_seconds=60
+    )
+    r2 = client.post("/wishes", json=WISH, headers=headers)
+
+    assert r1.status_code == r2.status_code == 201
+    assert r2.json() == r1.json()
+    assert r2.headers["idempotent-replayed"] == "true"
+
+
+def test_database_store_purges_expired_rows(db_session) -> None:
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db_session.add_all(
+        models.IdempotencyRecord(
+            key_hash=f"old-{i}",
+            fingerprint="fp",
+            status_code=201,
+            body="{}",
+            expires_at=expired,
+        )
+        for i in range(3)
+    )
+    db_session.commit()
+
+    store = DatabaseIdempotencyStore(purge_batch_size=2)
+    store.put("fresh", StoredResponse(201, b"{}", "fp", time.time() + 60))
+
+    keys = db_session.execute(select(models.IdempotencyRecord.key_hash)).scalars()
+    # Запись удаляет не больше purge_batch_size истёкших, остальные — следующие.
+    assert len([key for key in keys if key.startswith("old-")]) == 1
+    store.put("fresh-2", StoredResponse(201, b"{}", "fp", time.time() + 60))
+    keys = db_session.execute(select(models.IdempotencyRecord.key_hash)).scalars()
+    assert sorted(keys) == ["fresh", "fresh-2"]
+
+
+def test_memory_store_lru_and_ttl() -> None:
+    store = MemoryIdempotencyStore(max_entries=2)
+
+    def stored(ttl: float) -> StoredResponse:
+        return StoredResponse(201, b"{}", "fp", time.time() + ttl)
+
+    store.put("a", stored(60))
+    store.put("b", stored(60))
+    assert store.get("a") is not None
+    store.put("c", stored(60))
+    assert store.get("b") is None
+    assert store.get("a") is not None
+
+    store.put("expired", stored(-1))
+    assert store.get("expired") is None
@@ -0,0 +1,239 @@
+import asyncio
+import socket
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import link_preview
+from app.core.link_preview import (
+    HttpLinkFetcher,
+    LinkFetchError,
+    LinkPreview,
+    LinkPreviewService,
+    get_link_previews,
+    normalize_url,
+    parse_preview,
+)
+from app.main import app
+from tests.test_wishes import register_and_login
+
+
+class FakeFetcher:
+    """
+    Фейковый загрузчик: ничего не качает, считает вызовы и одновременность.
+    """
+
+    def __init__(self, delay: float = 0.0, fail: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.calls: list[str] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def fetch(self, url: str) -> LinkPreview:
+        self.calls.append(url)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise LinkFetchError("fetch failed")
+            return LinkPreview(
+                title="Steam Deck OLED",
+                image_url="https://cdn.example.com/deck.png",
+                price=Decimal("549.00"),
+                currency="USD",
+            )
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def fetcher():
+    fake = FakeFetcher()
+    service = LinkPreviewService(fake)
+    app.dependency_overrides[get_link_previews] = lambda: service
+    yield fake
+    app.dependency_overrides.pop(get_link_previews, None)
+
+
+def _create(client: TestClient, headers: dict, link: str) -> int:
+    r = client.post(
+        "/wishes",
+        json={"title": "Deck", "link": link, "price_estimate": "500.00", "notes": ""},
+        headers=headers,
+    )
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def test_normalize_url() -> None:
+    assert (
+        normalize_url(
+            "HTTPS://Shop.Example.com:443/item/42/?utm_source=x&b=2&a=1#reviews"
+        )
+        == "https://shop.example.com/item/42?a=1&b=2"
+    )
+    assert (
+        normalize_url("http://shop.example.com:8080") == "http://shop.example.com:8080/"
+    )
+    assert normalize_url("javascript:alert(1)") is None
+    assert normalize_url("") is None
+
+
+def test_parse_preview_reads_open_graph() -> None:
+    html = """
+        <html><head>
+        <title>Fallback</title>
+        <meta property="og:title" content="Steam Deck">
+        <meta property="og:image" content="/img/deck.png">
+        <meta property="product:price:amount" content="399,9">
+        <meta property="product:price:currency" content="EUR">
+        </head></html>
+    """
+    preview = parse_preview(html, "https://shop.example.com/item/1")
+    assert preview.title == "Steam Deck"
+    assert preview.image_url == "https://shop.example.com/img/deck.png"
+    assert preview.price == Decimal("399.90")
+    assert preview.currency == "EUR"
+
+
+def test_same_product_fetched_once(client: TestClient, fetcher: FakeFetcher) -> None:
+    links = [
+        "https://shop.example.com/deck?utm_source=tg",
+        "https://SHOP.example.com/deck/",
+        "https://shop.example.com/deck#specs",
+    ]
+    wish_ids = []
+    for idx, link in enumerate(links, start=1):
+        headers = register_and_login(client, idx=idx)
+        wish_ids.append((headers, _create(client, headers, link)))
+
+    assert fetcher.calls == ["https://shop.example.com/deck"]
+
+    for headers, wish_id in wish_ids:
+        r = client.get(f"/wishes/{wish_id}/link-preview", headers=headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        assert body["title"] == "Steam Deck OLED"
+        assert body["price"] == "549.00"
+        assert body["url"] == "https://shop.example.com/deck"
+
+
+def test_preview_not_available(client: TestClient, fetcher: FakeFetcher) -> None:
+    headers = register_and_login(client, idx=1)
+    fetcher.fail = True
+    wish_id = _create(client, headers, "https://shop.example.com/broken")
+
+    r = client.get(f"/wishes/{wish_id}/link-preview", headers=headers)
+    assert r.status_code == 404
+    assert r.json()["error"]["code"] == "link_preview_not_found"
+    # Ошибка тоже кешируется на error TTL — повторной загрузки нет.
+    assert len(fetcher.calls) == 1
+
+
+def test_preview_owner_only(client: TestClient, fetcher: FakeFetcher) -> None:
+    headers1 = register_and_login(client, idx=1)
+    headers2 = register_and_login(client, idx=2)
+    wish_id = _create(client, headers1, "https://shop.example.com/deck")
+
+    r = client.get(f"/wishes/{wish_id}/link-preview", headers=headers2)
+    assert r.status_code == 403
+
+
+def test_concurrency_is_bounded_and_deduplicated(db_engine) -> None:
+    fake = FakeFetcher(delay=0.01)
+    service = LinkPreviewService(fake, max_concurrency=2)
+    urls = [f"https://shop.example.com/item/{i % 5}?utm_medium={i}" for i in range(20)]
+
+    async def run() -> None:
+        await asyncio.gather(*(service.enrich(url) for url in urls))
+
+    asyncio.run(run())
+
+    assert sorted(fake.calls) == [
+        f"https://shop.example.com/item/{i}" for i in range(5)
+    ]
+    assert fake.max_active <= 2
+
+
+PUBLIC_ADDRESS = "93.184.216.34"
+
+
+def test_connection_uses_checked_address(monkeypatch) -> None:
+    # DNS rebinding: первый ответ — публичный адрес, следующие — loopback.
+    answers = [PUBLIC_ADDRESS, "127.0.0.1", "127.0.0.1"]
+    connected = []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        address = answers.pop(0)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+
+    def create_connection(address, *args, **kwargs):
+        connected.append(address[0])
+        raise ConnectionRefusedError()
+
+    monkeypatch.setattr(link_preview.socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(link_preview.socket, "create_connection", create_connection)
+
+    with pytest.raises(LinkFetchError):
+        HttpLinkFetcher(timeout=1, max_bytes=1024)._fetch_sync("http://rebind.test/")
+
+    assert connected == [PUBLIC_ADDRESS]
+    assert len(answers) == 2
+
+
+def test_redirect_to_private_host_is_blocked(monkeypatch) -> None:
+    class Redirect(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            self.send_response(302)
+            self.send_header("Location", f"http://localhost:{self.server.server_port}/")
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Redirect)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+
+    # public.test «резолвится» в наш локальный сервер; localhost — как обычно.
+    original = link_preview._public_address
+    monkeypatch.setattr(
+        link_preview,
+        "_public_address",
+        lambda host, port: (
+            "127.0.0.1" if host == "public.test" else original(host, port)
+        ),
+    )
+
+    fetcher = HttpLinkFetcher(timeout=5, max_bytes=1024)
+    with pytest.raises(LinkFetchError, match="host is not public"):
+        fetcher._fetch_sync(f"http://public.test:{server.server_port}/")
+    server.server_close()
+
+
+def test_unknown_charset_falls_back_to_utf8(monkeypatch) -> None:
+    class Page(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = "<title>Привет</title>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=x-bogus")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Page)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    monkeypatch.setattr(link_preview, "_public_address", lambda host, port: "127.0.0.1")
+
+    fetcher = HttpLinkFetcher(timeout=5, max_bytes=1024)
+    preview = fetcher._fetch_sync(f"http://public.test:{server.server_port}/")
+    server.server_close()
+
+    assert preview.title == "Привет"
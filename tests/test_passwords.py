@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import security
+from app.core.password_calibration import calibrate_rounds
+
+CREDENTIALS = {
+    "email": "hash@example.com",
+    "username": "hashuser",
+    "password": "password123",
+}
+
+
+def _login(client: TestClient) -> None:
+    r = client.post(
+        "/auth/login",
+        data={"username": CREDENTIALS["email"], "password": CREDENTIALS["password"]},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert r.status_code == 200, r.text
+
+
+def _stored_hash(db: Session) -> str:
+    db.expire_all()
+    return db.execute(
+        select(models.User.hashed_password).where(
+            models.User.email == CREDENTIALS["email"]
+        )
+    ).scalar_one()
+
+
+@pytest.fixture
+def registered(client: TestClient, monkeypatch) -> None:
+    monkeypatch.setattr(
+        security, "pwd_context", security.build_pwd_context("pbkdf2_sha256", 2000)
+    )
+    r = client.post("/auth/register", json=CREDENTIALS)
+    assert r.status_code == 201, r.text
+
+
+def test_login_rehashes_when_rounds_change(
+    client: TestClient, db_session: Session, registered, monkeypatch
+) -> None:
+    assert "$pbkdf2-sha256$2000$" in _stored_hash(db_session)
+
+    monkeypatch.setattr(
+        security, "pwd_context", security.build_pwd_context("pbkdf2_sha256", 1000)
+    )
+    before = security.password_rehash_total.value(scheme="pbkdf2_sha256")
+    _login(client)
+    assert "$pbkdf2-sha256$1000$" in _stored_hash(db_session)
+    assert security.password_rehash_total.value(scheme="pbkdf2_sha256") == before + 1
+
+    # Хеш уже по текущей политике — повторный вход ничего не пишет.
+    rehashed = _stored_hash(db_session)
+    _login(client)
+    assert _stored_hash(db_session) == rehashed
+    assert security.password_rehash_total.value(scheme="pbkdf2_sha256") == before + 1
+
+
+def test_login_migrates_to_new_scheme(
+    client: TestClient, db_session: Session, registered, monkeypatch
+) -> None:
+    monkeypatch.setattr(
+        security, "pwd_context", security.build_pwd_context("sha256_crypt", 1000)
+    )
+    _login(client)
+    assert _stored_hash(db_session).startswith("$5$rounds=1000$")
+    _login(client)
+
+
+def test_verify_latency_is_exported(client: TestClient, registered) -> None:
+    before = security.password_verify_seconds.count(scheme="pbkdf2_sha256")
+    _login(client)
+    assert security.password_verify_seconds.count(scheme="pbkdf2_sha256") == before + 1
+
+    metrics = client.get("/metrics").text
+    assert 'password_verify_seconds_count{scheme="pbkdf2_sha256"}' in metrics
+    assert 'password_verify_seconds_bucket{scheme="pbkdf2_sha256",le="+Inf"}' in metrics
+
+
+def test_calibrate_rounds() -> None:
+    cheap = calibrate_rounds("pbkdf2_sha256", 0.001, probe_rounds=1000)
+    costly = calibrate_rounds("pbkdf2_sha256", 0.05, probe_rounds=1000)
+    assert 1 <= cheap < costly
+
+    rounds = calibrate_rounds("sha256_crypt", 0.001, probe_rounds=1000)
+    assert rounds >= 1000
+
+    with pytest.raises(ValueError):
+        calibrate_rounds("plaintext", 0.1)
@@ -0,0 +1,190 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.profiling import RequestTimings, http_request_phase_seconds
+from tests.test_wishes import register_and_login
+
+
+@pytest.fixture
+def admin_headers(client: TestClient, monkeypatch) -> dict:
+    headers = register_and_login(client, idx=1)
+    monkeypatch.setattr(settings, "admin_usernames", ["user1"])
+    return headers
+
+
+def test_nested_phases_are_exclusive() -> None:
+    timings = RequestTimings()
+    with timings.phase("auth"):
+        time.sleep(0.02)
+        time.sleep(0.01)
+        timings.add("db", 0.01)
+        with timings.phase("serialization"):
+            time.sleep(0.02)
+
+    assert timings.phases["db"] == 0.01
+    assert timings.phases["serialization"] >= 0.02
+    # auth = 0.02 сна + накладные, без вложенных db и serialization.
+    assert 0.015 < timings.phases["auth"] < 0.03
+
+
+def test_failed_statements_leave_no_state_on_connection(db_session: Session) -> None:
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT * FROM no_such_table"))
+        db_session.rollback()
+
+    assert "query_started" not in db_session.connection().info
+
+
+def test_route_histograms_recorded(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    labels = {"method": "GET", "route": "/wishes/{wish_id}"}
+
+    before = {
+        name: http_request_phase_seconds.count(**labels, phase=name)
+        for name in ("auth", "db", "serialization", "framework")
+    }
+    r = client.post(
+        "/wishes",
+        json={"title": "x", "link": "", "price_estimate": "1.00", "notes": ""},
+        headers=headers,
+    )
+    client.get(f"/wishes/{r.json()['id']}", headers=headers)
+
+    for name, count in before.items():
+        assert http_request_phase_seconds.count(**labels, phase=name) == count + 1
+
+    metrics = client.get("/metrics").text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/wishes/{wish_id}",status="200"}'
+    ) in metrics
+
+
+def test_profile_requires_admin(client: TestClient) -> None:
+    headers = register_and_login(client, idx=2)
+    r = client.post("/admin/profile?seconds=0.1", headers=headers)
+    assert r.status_code == 403
+    assert client.post("/admin/profile?seconds=0.1").status_code == 401
+
+
+def test_profile_returns_collapsed_stacks(client: TestClient, admin_headers) -> None:
+    stop = threading.Event()
+
+    def busy_worker() -> None:
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_worker, name="busy worker")
+    worker.start()
+    try:
+        r = client.post(
+            "/admin/profile?seconds=0.2&interval_ms=5", headers=admin_headers
+        )
+    finally:
+        stop.set()
+        worker.join()
+
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith("text/plain")
+    pid = r.headers["x-profiler-pids"]
+    assert pid == str(os.getpid())
+    lines = r.text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert " " not in stack
+        assert stack.startswith(f"pid-{pid};")
+    assert any(
+        line.startswith(f"pid-{pid};busy_worker;")
+        and line.split(" ")[0].endswith(":busy_worker")
+        for line in lines
+    )
+
+
+def test_profile_limits(client: TestClient, admin_headers, monkeypatch) -> None:
+    r = client.post("/admin/profile?seconds=3600", headers=admin_headers)
+    assert r.status_code == 422
+
+    monkeypatch.setattr(profiling.profiler, "profile", lambda *args: None)
+    r = client.post("/admin/profile?seconds=0.1", headers=admin_headers)
+    assert r.status_code == 409
+    assert r.json()["error"]["code"] == "profiler_busy"
+
+
+@pytest.fixture
+def shared_exchange(tmp_path):
+    exchange = profiling.exchange
+    exchange.configure(str(tmp_path), 0.05)
+    exchange.start()
+    yield exchange
+    exchange.stop()
+    exchange.configure(None, settings.profiler_poll_seconds)
+
+
+def test_profile_covers_all_workers(
+    client: TestClient, admin_headers, shared_exchange, tmp_path
+) -> None:
+    # Второй «воркер» — отдельный процесс, следящий за тем же каталогом.
+    worker = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time\n"
+            "from app.core.profiling import exchange\n"
+            "exchange.configure(sys.argv[1], 0.05)\n"
+            "exchange.start()\n"
+            "print('ready', flush=True)\n"
+            "time.sleep(60)\n",
+            str(tmp_path),
+        ],
+        cwd=Path(__file__).resolve().parents[1],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert worker.stdout.readline().strip() == "ready"
+        r = client.post(
+            "/admin/profile?seconds=0.2&interval_ms=5", headers=admin_headers
+        )
+    finally:
+        worker.kill()
+        worker.wait()
+
+    assert r.status_code == 200, r.text
+    pids = {str(os.getpid()), str(worker.pid)}
+    assert set(r.headers["x-profiler-pids"].split(",")) == pids
+    roots = {line.split(";", 1)[0] for line in r.text.splitlines()}
+    assert roots == {f"pid-{pid}" for pid in pids}
+    assert os.listdir(tmp_path) == []
+
+
+def test_profile_session_is_exclusive_across_workers(
+    client: TestClient, admin_headers, shared_exchange, tmp_path
+) -> None:
+    (tmp_path / "request.json").write_text(
+        json.dumps({"session": "other", "until": time.time() + 30, "interval": 0.01})
+    )
+    r = client.post("/admin/profile?seconds=0.1", headers=admin_headers)
+    assert r.status_code == 409
+
+    # Запрос давно упавшего воркера не блокирует новые сессии.
+    (tmp_path / "request.json").write_text(
+        json.dumps({"session": "old", "until": time.time() - 60, "interval": 0.01})
+    )
+    r = client.post("/admin/profile?seconds=0.1", headers=admin_headers)
+    assert r.status_code == 200
@@ -0,0 +1,101 @@
+import cProfile
+import pstats
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlalchemy.engine.default import CACHE_HIT
+from sqlalchemy.orm import Session
+
+from app import models, queries
+from app.database import engine
+from tests.test_wishes import register_and_login
+
+
+def _legacy_list_statements(
+    db: Session, owner_id: int, limit: int, offset: int, price_lt
+):
+    """
+    Так list_wishes строил запросы раньше — через legacy Query API.
+    """
+    query = db.query(models.Wish).filter(models.Wish.owner_id == owner_id)
+    if price_lt is not None:
+        query = query.filter(models.Wish.price_estimate < price_lt)
+    count = query.with_entities(func.count(models.Wish.id))
+    page = query.order_by(models.Wish.created_at.desc()).offset(offset).limit(limit)
+    return count.statement, page.statement
+
+
+def _lambda_list_statements(
+    db: Session, owner_id: int, limit: int, offset: int, price_lt
+):
+    return (
+        queries.wishes_count(owner_id, price_lt),
+        queries.wishes_page(owner_id, limit, offset, price_lt),
+    )
+
+
+def _profile_construction(build, db: Session, rounds: int = 200) -> pstats.Stats:
+    """
+    Профилируем построение запросов и вычисление cache key — ровно ту работу,
+    которую Python делает на каждый запрос до обращения к кешу компиляции.
+    """
+    for stmt in build(db, 1, 10, 0, Decimal("5")):
+        stmt._generate_cache_key()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for i in range(rounds):
+        for stmt in build(db, i, 10, i, Decimal(i)):
+            stmt._generate_cache_key()
+    profiler.disable()
+    return pstats.Stats(profiler)
+
+
+def test_lambda_statements_cut_construction_cost(
+    db_session: Session, record_property
+) -> None:
+    legacy = _profile_construction(_legacy_list_statements, db_session)
+    current = _profile_construction(_lambda_list_statements, db_session)
+
+    record_property("legacy_calls_per_request", legacy.total_calls / 200)
+    record_property("lambda_calls_per_request", current.total_calls / 200)
+    assert current.total_calls < legacy.total_calls * 0.6
+
+
+def test_hot_queries_hit_compiled_cache(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    r = client.post(
+        "/wishes",
+        json={"title": "Book", "link": "", "price_estimate": "10.00", "notes": ""},
+        headers=headers,
+    )
+    assert r.status_code == 201
+    wish_id = r.json()["id"]
+
+    def hot_requests(limit: int, offset: int) -> None:
+        assert client.get(
+            f"/wishes?limit={limit}&offset={offset}", headers=headers
+        ).is_success
+        assert client.get(
+            f"/wishes?limit={limit}&offset={offset}&price_lt=50", headers=headers
+        ).is_success
+        assert client.get(f"/wishes/{wish_id}", headers=headers).is_success
+
+    hot_requests(10, 0)
+
+    cache_stats = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            cache_stats.append(context.cache_hit)
+
+    event.listen(engine, "after_cursor_execute", on_execute)
+    try:
+        hot_requests(5, 1)
+        hot_requests(20, 3)
+    finally:
+        event.remove(engine, "after_cursor_execute", on_execute)
+
+    assert cache_stats
+    assert all(stat is CACHE_HIT for stat in cache_stats)
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import security
+
+
+def _login(client: TestClient) -> dict:
+    r = client.post(
+        "/auth/register",
+        json={
+            "email": "refresh@example.com",
+            "username": "refresh",
+            "password": "password123",
+        },
+    )
+    assert r.status_code == 201, r.text
+    r = client.post(
+        "/auth/login",
+        data={"username": "refresh", "password": "password123"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _refresh(client: TestClient, refresh_token: str):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rotates_tokens_without_password_hashing(client: TestClient) -> None:
+    tokens = _login(client)
+    assert tokens["refresh_token"]
+
+    verifies = security.password_verify_seconds.count(scheme="pbkdf2_sha256")
+    r = _refresh(client, tokens["refresh_token"])
+    assert r.status_code == 200, r.text
+    renewed = r.json()
+    assert security.password_verify_seconds.count(scheme="pbkdf2_sha256") == verifies
+
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert client.get("/wishes", headers=headers).status_code == 200
+
+    r_again = _refresh(client, renewed["refresh_token"])
+    assert r_again.status_code == 200
+
+
+def test_refresh_token_stored_hashed(client: TestClient, db_session: Session) -> None:
+    tokens = _login(client)
+    token_id, _, secret = tokens["refresh_token"].partition(".")
+
+    record = db_session.execute(
+        select(models.RefreshToken).where(models.RefreshToken.token_id == token_id)
+    ).scalar_one()
+    assert secret not in record.token_hash
+    assert len(record.token_hash) == 64
+
+
+def test_reused_refresh_token_revokes_family(client: TestClient) -> None:
+    tokens = _login(client)
+    renewed = _refresh(client, tokens["refresh_token"]).json()
+
+    # Старый токен предъявлен повторно — считаем его украденным.
+    r = _refresh(client, tokens["refresh_token"])
+    assert r.status_code == 401
+    assert r.json()["error"]["code"] == "invalid_refresh_token"
+
+    assert _refresh(client, renewed["refresh_token"]).status_code == 401
+
+
+def test_logout_revokes_refresh_token(client: TestClient) -> None:
+    tokens = _login(client)
+    r = client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+    assert r.status_code == 204
+    assert _refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_expired_and_forged_refresh_tokens(
+    client: TestClient, db_session: Session
+) -> None:
+    tokens = _login(client)
+    token_id, _, secret = tokens["refresh_token"].partition(".")
+
+    assert _refresh(client, "garbage").status_code == 401
+    assert _refresh(client, f"{token_id}.{secret[:-1]}x").status_code == 401
+
+    db_session.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.token_id == token_id)
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    db_session.commit()
+    assert _refresh(client, tokens["refresh_token"]).status_code == 401
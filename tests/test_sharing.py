@@ -0,0 +1,127 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core.sharing import shared_lists, shared_snapshot_builds_total
+from app.database import engine
+from tests.test_wishes import register_and_login
+
+WISH = {"title": "x", "link": "", "price_estimate": "1.00", "notes": ""}
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_lists():
+    # Между тестами БД чистится и id пользователей повторяются.
+    shared_lists.clear()
+    yield
+    shared_lists.clear()
+
+
+@pytest.fixture
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _share(client: TestClient, headers: dict) -> dict:
+    r = client.post("/wishes/shares", headers=headers)
+    assert r.status_code == 201
+    return r.json()
+
+
+def test_shared_snapshot_is_public_and_cached(
+    client: TestClient, count_queries: list
+) -> None:
+    headers = register_and_login(client, idx=1)
+    for title in ("first", "second"):
+        client.post("/wishes", json={**WISH, "title": title}, headers=headers)
+    share = _share(client, headers)
+
+    r = client.get(share["url"])
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 2
+    assert [item["title"] for item in body["items"]] == ["second", "first"]
+    assert "owner_id" not in body["items"][0]
+    assert r.headers["cache-control"] == "public, max-age=60"
+    etag = r.headers["etag"]
+    assert etag.startswith('"')
+
+    count_queries.clear()
+    again = client.get(share["url"])
+    assert again.content == r.content
+    assert count_queries == []
+
+    not_modified = client.get(share["url"], headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+
+def test_snapshot_is_patched_on_owner_writes(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    wish_id = client.post("/wishes", json=WISH, headers=headers).json()["id"]
+    share = _share(client, headers)
+    etag = client.get(share["url"]).headers["etag"]
+    full_builds = shared_snapshot_builds_total.value(kind="full")
+
+    client.put(f"/wishes/{wish_id}", json={"title": "renamed"}, headers=headers)
+    r = client.get(share["url"], headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [item["title"] for item in r.json()["items"]] == ["renamed"]
+
+    client.post("/wishes", json={**WISH, "title": "newer"}, headers=headers)
+    client.delete(f"/wishes/{wish_id}", headers=headers)
+    assert [item["title"] for item in client.get(share["url"]).json()["items"]] == [
+        "newer"
+    ]
+    assert shared_snapshot_builds_total.value(kind="full") == full_builds
+
+
+def test_revoked_and_invalid_tokens(client: TestClient) -> None:
+    owner = register_and_login(client, idx=1)
+    other = register_and_login(client, idx=2)
+    share = _share(client, owner)
+    assert client.get(share["url"]).status_code == 200
+
+    token_id = share["id"]
+    assert client.get(f"/shared/{token_id}.wrong-secret").status_code == 404
+    assert client.get("/shared/garbage").json()["error"]["code"] == "share_not_found"
+
+    assert client.delete(f"/wishes/shares/{token_id}", headers=other).status_code == 404
+    assert client.delete(f"/wishes/shares/{token_id}", headers=owner).status_code == 204
+    assert client.get(share["url"]).status_code == 404
+
+
+def test_shared_list_requires_no_auth_but_share_creation_does(
+    client: TestClient,
+) -> None:
+    assert client.post("/wishes/shares").status_code == 401
+
+
+def test_compressed_snapshot_has_its_own_etag(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    for i in range(10):
+        wish = {**WISH, "title": f"wish {i}", "notes": "n" * 200}
+        client.post("/wishes", json=wish, headers=headers)
+    url = _share(client, headers)["url"]
+
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == identity.content
+    etag = identity.headers["etag"]
+    assert gzipped.headers["etag"] == etag[:-1] + '-gzip"'
+
+    for tag in (etag, gzipped.headers["etag"]):
+        r = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+        assert r.status_code == 304
+        assert r.headers["etag"] == tag
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core.errors import ApiError
+from app.core.singleflight import SingleFlight
+from app.database import engine
+from tests.test_wishes import register_and_login
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow() -> str:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        leader = pool.submit(flights.do, (1, "route"), slow)
+        assert started.wait(5)
+        followers = [pool.submit(flights.do, (1, "route"), slow) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+
+        assert leader.result() == ("result", False)
+        assert [f.result() for f in followers] == [("result", True)] * 4
+    assert len(calls) == 1
+
+    # Вызов завершился — следующий идёт заново.
+    assert flights.do((1, "route"), lambda: "fresh") == ("fresh", False)
+
+
+def test_error_is_shared_with_followers() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing() -> None:
+        started.set()
+        release.wait(5)
+        raise ApiError(code="forbidden", message="nope", status_code=403)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, (1, "route"), failing)
+        assert started.wait(5)
+        follower = pool.submit(flights.do, (1, "route"), failing)
+        time.sleep(0.05)
+        release.set()
+
+        for future in (leader, follower):
+            with pytest.raises(ApiError):
+                future.result()
+
+
+def test_forget_detaches_owner_calls() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def stale() -> str:
+        started.set()
+        release.wait(5)
+        return "before write"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flights.do, (1, "route"), stale)
+        assert started.wait(5)
+
+        flights.forget(2)
+        assert flights.do((2, "route"), lambda: "other owner") == ("other owner", False)
+
+        flights.forget(1)
+        assert flights.do((1, "route"), lambda: "after write") == ("after write", False)
+
+        release.set()
+        assert leader.result() == ("before write", False)
+
+
+def test_identical_list_requests_share_queries(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    for i in range(3):
+        r = client.post(
+            "/wishes",
+            json={"title": f"w{i}", "link": "", "price_estimate": "1.00", "notes": ""},
+            headers=headers,
+        )
+        assert r.status_code == 201
+
+    page_queries = []
+
+    def slow_page_query(conn, cursor, statement, parameters, context, executemany):
+        if "FROM wishes" in statement and "count(" not in statement:
+            page_queries.append(statement)
+            # Тормозим запрос страницы, чтобы параллельные запросы пересеклись.
+            time.sleep(0.2)
+
+    event.listen(engine, "before_cursor_execute", slow_page_query)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(
+                pool.map(
+                    lambda _: client.get("/wishes?limit=10&offset=0", headers=headers),
+                    range(4),
+                )
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", slow_page_query)
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses}) == 1
+    assert responses[0].json()["total"] == 3
+    assert len(page_queries) < 4
+
+
+def test_write_is_visible_to_next_read(client: TestClient) -> None:
+    headers = register_and_login(client, idx=1)
+    assert client.get("/wishes", headers=headers).json()["total"] == 0
+
+    r = client.post(
+        "/wishes",
+        json={"title": "new", "link": "", "price_estimate": "1.00", "notes": ""},
+        headers=headers,
+    )
+    assert r.status_code == 201
+    wish_id = r.json()["id"]
+    assert client.get("/wishes", headers=headers).json()["total"] == 1
+
+    client.put(f"/wishes/{wish_id}", json={"title": "renamed"}, headers=headers)
+    assert (
+        client.get(f"/wishes/{wish_id}", headers=headers).json()["title"] == "renamed"
+    )
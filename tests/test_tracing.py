@@ -0,0 +1,157 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core import tracing
+from app.core.tracing import (
+    FileSpanExporter,
+    InMemorySpanExporter,
+    format_traceparent,
+    parse_traceparent,
+    tracer,
+)
+from app.database import SessionLocal
+from tests.test_wishes import register_and_login
+
+INCOMING_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+INCOMING_PARENT = f"00-{INCOMING_TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def exporter():
+    previous = tracer.exporter, tracer.sample_ratio
+    exporter = InMemorySpanExporter()
+    tracer.configure(exporter, 1.0)
+    yield exporter
+    tracer.configure(*previous)
+
+
+def test_traceparent_roundtrip() -> None:
+    trace_id, span_id, sampled = parse_traceparent(INCOMING_PARENT)
+    assert sampled is True
+    span = tracing.NonRecordingSpan(trace_id, span_id)
+    assert format_traceparent(span) == INCOMING_PARENT.replace("-01", "-00")
+
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(f"00-{'0' * 32}-00f067aa0ba902b7-01") is None
+
+
+def test_request_spans(client: TestClient, exporter: InMemorySpanExporter) -> None:
+    headers = register_and_login(client, idx=1)
+    r = client.post(
+        "/wishes",
+        json={"title": "x", "link": "", "price_estimate": "1.00", "notes": ""},
+        headers=headers,
+    )
+    exporter.clear()
+
+    r = client.get(
+        f"/wishes/{r.json()['id']}",
+        headers={**headers, "traceparent": INCOMING_PARENT},
+    )
+    assert r.status_code == 200
+
+    spans = {span["name"]: span for span in exporter.spans}
+    root = spans["HTTP GET /wishes/{wish_id}"]
+    assert root["parentSpanId"] == "00f067aa0ba902b7"
+    assert root["attributes"]["http.status_code"] == 200
+    assert {span["traceId"] for span in exporter.spans} == {INCOMING_TRACE_ID}
+    assert r.headers["traceparent"] == f"00-{INCOMING_TRACE_ID}-{root['spanId']}-01"
+
+    auth = spans["auth.get_current_user"]
+    assert auth["parentSpanId"] == root["spanId"]
+    assert spans["auth.jwt_decode"]["parentSpanId"] == auth["spanId"]
+    assert spans["auth.load_user"]["parentSpanId"] == auth["spanId"]
+    assert spans["serialization"]["parentSpanId"] == root["spanId"]
+
+    queries = [span for span in exporter.spans if span["name"] == "db.query"]
+    assert any(q["parentSpanId"] == spans["auth.load_user"]["spanId"] for q in queries)
+    assert all(q["attributes"]["db.statement"].startswith("SELECT") for q in queries)
+
+
+def test_login_traces_password_verification(
+    client: TestClient, exporter: InMemorySpanExporter
+) -> None:
+    register_and_login(client, idx=1)
+
+    names = [span["name"] for span in exporter.spans]
+    assert "auth.verify_password" in names
+    assert "HTTP POST /auth/login" in names
+
+
+def test_unsampled_requests_record_nothing(
+    client: TestClient, exporter: InMemorySpanExporter
+) -> None:
+    tracer.configure(exporter, 0.0)
+
+    r = client.get("/health")
+    parent = parse_traceparent(r.headers["traceparent"])
+    assert parent is not None and parent[2] is False
+    assert exporter.spans == []
+
+    # Без записывающего родителя дочерние спаны не создаются вовсе.
+    token = tracing._current_span.set(tracing.NonRecordingSpan(1, 1))
+    try:
+        with tracer.span("child") as span:
+            assert isinstance(span, tracing.NonRecordingSpan)
+    finally:
+        tracing._current_span.reset(token)
+
+    # Решение вызывающего сервиса (флаг sampled) важнее локального ratio.
+    client.get("/health", headers={"traceparent": INCOMING_PARENT})
+    assert [span["traceId"] for span in exporter.spans] == [INCOMING_TRACE_ID]
+
+
+def test_file_exporter_writes_json_lines(tmp_path) -> None:
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path))
+    exporter.export({"name": "a"})
+    exporter.export({"name": "b"})
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["a", "b"]
+
+
+def test_load_exporter() -> None:
+    assert tracing.load_exporter("none", "x") is None
+    assert isinstance(tracing.load_exporter("memory", "x"), InMemorySpanExporter)
+    custom = tracing.load_exporter("app.core.tracing:InMemorySpanExporter", "x")
+    assert isinstance(custom, InMemorySpanExporter)
+
+
+def test_spans_do_not_contain_url_secrets(
+    client: TestClient, exporter: InMemorySpanExporter
+) -> None:
+    headers = register_and_login(client, idx=1)
+    token = client.post("/wishes/shares", headers=headers).json()["token"]
+    secret = token.split(".", 1)[1]
+    exporter.clear()
+
+    assert client.get(f"/shared/{token}").status_code == 200
+    client.get(f"/no-such-route/{secret}")
+
+    exported = json.dumps(exporter.spans)
+    assert "HTTP GET /shared/{token}" in exported
+    assert secret not in exported
+
+
+def test_db_spans_do_not_outlive_the_statement(exporter: InMemorySpanExporter) -> None:
+    root = tracer.start_root("request")
+    token = tracing._current_span.set(root)
+    try:
+        with SessionLocal() as db:
+            with pytest.raises(OperationalError):
+                db.execute(text("SELECT * FROM no_such_table"))
+            db.rollback()
+            db.execute(text("SELECT 1"))
+            assert "trace_spans" not in db.connection().info
+    finally:
+        tracing._current_span.reset(token)
+
+    failed, ok = [span for span in exporter.spans if span["name"] == "db.query"]
+    assert failed["status"] == "ERROR"
+    assert ok["status"] == "UNSET"
+    assert {failed["parentSpanId"], ok["parentSpanId"]} == {f"{root.span_id:016x}"}
@@ -0,0 +1,97 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import queries, schemas
+from app.core.config import settings
+from tests.test_wishes import register_and_login
+
+PAGE_SIZE = 100
+
+
+@pytest.fixture
+def full_page(client: TestClient, db_session: Session) -> dict:
+    """
+    Пользователь со 100 «тяжёлыми» желаниями — полная страница list_wishes.
+    """
+    headers = register_and_login(client, idx=1)
+    for i in range(PAGE_SIZE):
+        r = client.post(
+            "/wishes",
+            json={
+                "title": f"wish-{i}",
+                "link": f"https://example.com/item/{i}",
+                "price_estimate": f"{i}.99",
+                "notes": "n" * 1000,
+            },
+            headers=headers,
+        )
+        assert r.status_code == 201
+    return headers
+
+
+def _measure(client: TestClient, headers: dict, rounds: int = 20) -> tuple[float, int]:
+    url = f"/wishes?limit={PAGE_SIZE}&offset=0"
+    assert client.get(url, headers=headers).status_code == 200
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        client.get(url, headers=headers)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    client.get(url, headers=headers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def test_projection_matches_entity_mode(
+    client: TestClient, full_page: dict, monkeypatch
+) -> None:
+    url = f"/wishes?limit={PAGE_SIZE}&offset=0&price_lt=50"
+
+    monkeypatch.setattr(settings, "wishes_list_projection", False)
+    entity_body = client.get(url, headers=full_page).content
+
+    monkeypatch.setattr(settings, "wishes_list_projection", True)
+    projection_body = client.get(url, headers=full_page).content
+
+    # Проекция собирается без валидации — байты ответа те же.
+    assert projection_body == entity_body
+    assert json.loads(projection_body)["total"] == 50
+
+
+def test_projection_skips_identity_map(
+    client: TestClient, db_session: Session, full_page: dict
+) -> None:
+    owner_id = client.get("/wishes?limit=1", headers=full_page).json()["items"][0][
+        "owner_id"
+    ]
+
+    rows = db_session.execute(queries.wishes_page_rows(owner_id, PAGE_SIZE, 0)).all()
+    assert len(rows) == PAGE_SIZE
+    assert len(db_session.identity_map) == 0
+    assert rows[0]._fields == tuple(schemas.WishRead.model_fields)
+
+
+def test_projection_benchmark(
+    client: TestClient, full_page: dict, monkeypatch, record_property
+) -> None:
+    monkeypatch.setattr(settings, "wishes_list_projection", False)
+    entity_time, entity_peak = _measure(client, full_page)
+
+    monkeypatch.setattr(settings, "wishes_list_projection", True)
+    projection_time, projection_peak = _measure(client, full_page)
+
+    record_property("entity_ms", entity_time * 1e3)
+    record_property("entity_peak_kib", entity_peak / 1024)
+    record_property("projection_ms", projection_time * 1e3)
+    record_property("projection_peak_kib", projection_peak / 1024)
+    assert projection_peak < entity_peak